@@ -0,0 +1,171 @@
+"""
+Admission Control
+Sorts requests into priority classes so that billing at the counter keeps
+working while month-end reports pile up. Each request must pass:
+
+1. a token bucket per caller (requests per second with a burst). Callers
+   with a valid login token are keyed on its subject; everyone else,
+   including /auth/login and forged tokens, is keyed on client IP,
+2. a per-route concurrency limit for known heavy routes,
+3. a share of the global concurrency budget that shrinks with priority, so
+   reports are shed first and billing is shed last.
+
+Rejected requests get 429 with Retry-After straight away instead of queueing
+behind work the server cannot finish in time. Operations inside /api/batch
+are admitted one by one on top of the batch request itself.
+"""
+import math
+import os
+import time
+from collections import Counter, OrderedDict
+from enum import IntEnum
+from typing import Optional
+
+
+class Priority(IntEnum):
+    BILLING = 0
+    WRITE = 1
+    READ = 2
+    REPORT = 3
+
+
+# Fraction of the global concurrency budget each class may fill. A class is
+# only admitted while total in-flight requests are below its share.
+PRIORITY_SHARE = {
+    Priority.BILLING: 1.0,
+    Priority.WRITE: 0.9,
+    Priority.READ: 0.75,
+    Priority.REPORT: 0.5,
+}
+
+# (method, path, route key, priority, per-route concurrency limit or None).
+# A path ending in "/" matches as a prefix; otherwise it must match exactly.
+ROUTE_RULES = [
+    ("POST", "/api/invoices", "create_invoice", Priority.BILLING, None),
+    ("POST", "/api/payments", "create_payment", Priority.BILLING, None),
+    ("POST", "/api/invoices/quote", "quote_invoice", Priority.BILLING, None),
+    ("GET", "/api/dashboard", "dashboard", Priority.REPORT, 4),
+    ("GET", "/api/invoices", "list_invoices", Priority.REPORT, 4),
+    ("GET", "/api/payments", "list_payments", Priority.REPORT, 4),
+    ("*", "/api/reports/", "reports", Priority.REPORT, 2),
+    ("POST", "/api/reminders/run", "reminders", Priority.REPORT, 1),
+    ("POST", "/api/batch", "batch", Priority.READ, 8),
+]
+
+# Never limited: liveness checks and CORS preflight
+EXEMPT_PATHS = {"/api/health"}
+
+READ_METHODS = {"GET", "HEAD"}
+
+# Rate-limit buckets kept in memory; the least recently used is dropped first
+MAX_BUCKETS = 10000
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class Ticket:
+    __slots__ = ("route", "priority")
+
+    def __init__(self, route: str, priority: Priority):
+        self.route = route
+        self.priority = priority
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class AdmissionController:
+    def __init__(self, rules=ROUTE_RULES):
+        self.max_concurrency = int(os.environ.get("ADMISSION_MAX_CONCURRENCY", "64"))
+        self.rate_per_second = float(os.environ.get("ADMISSION_RATE_PER_SECOND", "20"))
+        self.burst = int(os.environ.get("ADMISSION_BURST", "40"))
+        self.rules = rules
+
+        self.in_flight = 0
+        self.in_flight_by_route = Counter()
+        self.admitted = Counter()
+        self.shed = Counter()
+        self._buckets = OrderedDict()
+
+    def classify(self, method: str, path: str):
+        for rule_method, rule_path, route, priority, limit in self.rules:
+            if rule_method != "*" and rule_method != method:
+                continue
+            if path == rule_path or (rule_path.endswith("/") and path.startswith(rule_path)):
+                return route, priority, limit
+        if method in READ_METHODS:
+            return "read", Priority.READ, None
+        return "write", Priority.WRITE, None
+
+    def _take_token(self, identity: Optional[str]) -> Optional[int]:
+        """Take one token from the caller's bucket; return seconds to wait if empty."""
+        if not identity or self.rate_per_second <= 0:
+            return None
+        now = time.monotonic()
+        bucket = self._buckets.get(identity)
+        if bucket is None:
+            if len(self._buckets) >= MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+            bucket = self._buckets[identity] = TokenBucket(self.burst, now)
+        else:
+            self._buckets.move_to_end(identity)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate_per_second)
+            bucket.updated = now
+        if bucket.tokens < 1:
+            return max(1, math.ceil((1 - bucket.tokens) / self.rate_per_second))
+        bucket.tokens -= 1
+        return None
+
+    def admit(self, method: str, path: str, identity: Optional[str]) -> Optional[Ticket]:
+        """Admit a request or raise AdmissionRejected. Exempt requests return None.
+
+        `identity` keys the rate limit, e.g. "user:<email>" or "ip:<address>".
+        """
+        if method == "OPTIONS" or path in EXEMPT_PATHS:
+            return None
+
+        route, priority, route_limit = self.classify(method, path)
+
+        if route_limit is not None and self.in_flight_by_route[route] >= route_limit:
+            self.shed[route] += 1
+            raise AdmissionRejected("Too many concurrent requests for this resource", 1)
+
+        if self.in_flight >= self.max_concurrency * PRIORITY_SHARE[priority]:
+            self.shed[route] += 1
+            raise AdmissionRejected("Server is busy, please retry", 1)
+
+        retry_after = self._take_token(identity)
+        if retry_after is not None:
+            self.shed[route] += 1
+            raise AdmissionRejected("Rate limit exceeded", retry_after)
+
+        self.in_flight += 1
+        self.in_flight_by_route[route] += 1
+        self.admitted[route] += 1
+        return Ticket(route, priority)
+
+    def release(self, ticket: Ticket):
+        self.in_flight -= 1
+        self.in_flight_by_route[ticket.route] -= 1
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "rate_per_second": self.rate_per_second,
+            "burst": self.burst,
+            "tracked_callers": len(self._buckets),
+            "in_flight": self.in_flight,
+            "in_flight_by_route": {k: v for k, v in self.in_flight_by_route.items() if v},
+            "admitted": dict(self.admitted),
+            "shed": dict(self.shed),
+        }
@@ -0,0 +1,173 @@
+"""
+Audit Log
+Records who changed what without adding a database round trip to the request
+path. Routes push events onto a bounded in-memory queue; a background task
+writes them to the `audit_log` collection with insert_many once a batch fills
+up or the flush interval passes. When the queue is full, record() waits for
+space, slowing writers down instead of dropping events. A failed write is
+retried with exponential backoff until it succeeds. Meanwhile the queue
+fills and applies the same backpressure. Events use their id as `_id`, so
+a retry after a partial insert cannot store duplicates. close() drains the
+queue on shutdown. At that point a batch is only abandoned, and logged,
+after AUDIT_MAX_RETRIES failed attempts, and the whole drain is cut off after
+AUDIT_SHUTDOWN_TIMEOUT_SECONDS so a database outage cannot hold up shutdown;
+whatever is still unwritten then is counted as failed.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+AUDIT_COLLECTION = "audit_log"
+
+_STOP = object()
+
+DUPLICATE_KEY = 11000
+
+
+def _only_duplicates(exc: Exception) -> bool:
+    """True if a bulk insert failed only because some events were already stored."""
+    details = getattr(exc, "details", None)
+    if not isinstance(details, dict) or details.get("writeConcernErrors"):
+        return False
+    errors = details.get("writeErrors") or []
+    return bool(errors) and all(error.get("code") == DUPLICATE_KEY for error in errors)
+
+
+async def ensure_indexes(db):
+    await db[AUDIT_COLLECTION].create_index([("entity", 1), ("entity_id", 1), ("timestamp", -1)])
+    await db[AUDIT_COLLECTION].create_index([("timestamp", -1)])
+
+
+class AuditLog:
+    def __init__(self):
+        self.max_queue = int(os.environ.get("AUDIT_MAX_QUEUE", "10000"))
+        self.batch_size = int(os.environ.get("AUDIT_BATCH_SIZE", "500"))
+        self.flush_interval = float(os.environ.get("AUDIT_FLUSH_INTERVAL", "1.0"))
+        self.max_retries = int(os.environ.get("AUDIT_MAX_RETRIES", "5"))
+        self.retry_base_delay = float(os.environ.get("AUDIT_RETRY_BASE_SECONDS", "0.5"))
+        self.shutdown_timeout = float(os.environ.get("AUDIT_SHUTDOWN_TIMEOUT_SECONDS", "10"))
+
+        self.recorded = 0
+        self.flushed = 0
+        self.failed = 0
+        self.retries = 0
+        self.backpressure_waits = 0
+
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._db = None
+        self._task = None
+        self._closing = False
+        self._in_flight = 0
+
+    def start(self, db):
+        self._db = db
+        self._task = asyncio.create_task(self._run())
+
+    async def record(
+        self,
+        actor: str,
+        action: str,
+        entity: str,
+        entity_id: str,
+        changes: Optional[dict] = None
+    ):
+        event_id = str(uuid.uuid4())
+        event = {
+            "_id": event_id,
+            "id": event_id,
+            "actor": actor,
+            "action": action,
+            "entity": entity,
+            "entity_id": entity_id,
+            "changes": changes,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+        self.recorded += 1
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.backpressure_waits += 1
+            await self._queue.put(event)
+
+    async def close(self):
+        if self._task is None:
+            return
+        self._closing = True
+        try:
+            await asyncio.wait_for(self._drain(), self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            dropped = self._in_flight
+            while not self._queue.empty():
+                if self._queue.get_nowait() is not _STOP:
+                    dropped += 1
+            self.failed += dropped
+            logger.error("Audit log did not drain within %.1fs, dropping %d events",
+                         self.shutdown_timeout, dropped)
+        self._task = None
+
+    async def _drain(self):
+        await self._queue.put(_STOP)
+        await asyncio.shield(self._task)
+
+    def stats(self) -> dict:
+        return {
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "queued": self._queue.qsize(),
+            "backpressure_waits": self.backpressure_waits,
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = []
+            event = await self._queue.get()
+            deadline = loop.time() + self.flush_interval
+            while event is not _STOP:
+                batch.append(event)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    event = await asyncio.wait_for(self._queue.get(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+            if batch:
+                self._in_flight = len(batch)
+                await self._flush(batch)
+                self._in_flight = 0
+            if event is _STOP:
+                return
+
+    async def _flush(self, batch):
+        attempt = 0
+        while True:
+            try:
+                await self._db[AUDIT_COLLECTION].insert_many(batch, ordered=False)
+                break
+            except Exception as exc:
+                if _only_duplicates(exc):
+                    # An earlier attempt got part of the batch in; the rest is now stored too
+                    break
+                attempt += 1
+                if self._closing and attempt > self.max_retries:
+                    self.failed += len(batch)
+                    logger.exception("Dropping %d audit events after %d attempts", len(batch), attempt)
+                    return
+                self.retries += 1
+                delay = min(self.retry_base_delay * 2 ** (attempt - 1), 30.0)
+                logger.warning("Failed to write %d audit events (attempt %d), retrying in %.1fs: %s",
+                               len(batch), attempt, delay, exc)
+                await asyncio.sleep(delay)
+        self.flushed += len(batch)
@@ -0,0 +1,90 @@
+"""
+Compact Invoice Converter
+Rewrites stored invoices between the full line-item format (`products`, a
+list of subdocuments) and the compact format (`lines`, parallel arrays with a
+product-name dictionary). See encode_line_items() in models.py.
+
+Usage:
+    python compact_invoices.py                  # full -> compact
+    python compact_invoices.py --expand         # compact -> full
+    python compact_invoices.py --batch-size 2000
+
+Set INVOICE_LINE_ENCODING=compact in .env so new invoices are written compact
+as well.
+"""
+import argparse
+import asyncio
+import time
+
+from dotenv import load_dotenv
+
+from models import decode_line_items, encode_line_items
+from storage import create_client, get_database, storage_backend
+
+
+def _convert(invoice: dict, expand: bool):
+    if expand:
+        return {"$set": {"products": decode_line_items(invoice["lines"])}, "$unset": {"lines": ""}}
+    return {"$set": {"lines": encode_line_items(invoice["products"])}, "$unset": {"products": ""}}
+
+
+async def _write_batch(db, batch, expand: bool):
+    if storage_backend() == "mongo":
+        from pymongo import UpdateOne
+        await db.invoices.bulk_write(
+            [UpdateOne({"id": invoice["id"]}, _convert(invoice, expand)) for invoice in batch],
+            ordered=False
+        )
+    else:
+        for invoice in batch:
+            await db.invoices.update_one({"id": invoice["id"]}, _convert(invoice, expand))
+
+
+async def convert_invoices(expand: bool = False, batch_size: int = 1000):
+    client = create_client()
+    db = get_database(client)
+
+    source = "lines" if expand else "products"
+    query = {source: {"$exists": True}}
+    total = await db.invoices.count_documents(query)
+    print(f"Converting {total} invoices to {'full' if expand else 'compact'} line items...")
+
+    started = time.perf_counter()
+    converted = 0
+    batch = []
+    # Keep one batch writing while the next is read
+    pending = None
+    async for invoice in db.invoices.find(query, {"_id": 0, "id": 1, source: 1}):
+        if source not in invoice:
+            continue
+        batch.append(invoice)
+        if len(batch) >= batch_size:
+            if pending:
+                await pending
+            pending = asyncio.create_task(_write_batch(db, batch, expand))
+            converted += len(batch)
+            batch = []
+            print(f"  {converted}/{total}")
+    if pending:
+        await pending
+    if batch:
+        await _write_batch(db, batch, expand)
+        converted += len(batch)
+
+    elapsed = time.perf_counter() - started
+    print(f"[OK] Converted {converted} invoices in {elapsed:.1f}s")
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--expand', action='store_true', help='convert compact invoices back to full line items')
+    parser.add_argument('--batch-size', type=int, default=1000, help='invoices per bulk write')
+    args = parser.parse_args()
+
+    load_dotenv()
+    asyncio.run(convert_invoices(args.expand, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
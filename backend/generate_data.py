@@ -0,0 +1,352 @@
+"""
+Synthetic Data Generator
+Fills the database with a large, realistic dataset for capacity planning:
+
+- retailer activity is heavy-tailed (a few shops place most orders)
+- product popularity follows a Zipf-like curve over the catalog
+- invoice dates are seasonal (school reopening in June, exam season in
+  Feb/Mar) with quiet Sundays
+- older invoices are more likely paid, often in several installments;
+  recent ones are mostly unpaid or partial
+- every retailer's total_due equals the sum of its invoices' due amounts
+
+Invoices are generated in date order and written with concurrent insert_many
+batches. Collections are dropped and recreated rather than emptied, and
+indexes are built once after loading. History ends the day before
+--end-date (default: today); the same --seed, --end-date and sizes always
+produce the same data.
+
+Usage:
+    python generate_data.py --invoices 100000
+    python generate_data.py --invoices 100000 --end-date 2025-04-01
+    python generate_data.py --retailers 5000 --products 500 --invoices 10000000 \\
+        --months 24 --batch-size 5000 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from calendar import monthrange
+from datetime import date, datetime, timedelta, timezone
+from itertools import accumulate
+
+from dotenv import load_dotenv
+
+from invoice_numbers import FIRST_INVOICE_NUMBER, format_invoice_number, set_invoice_counter
+from models import encode_line_items
+from pricing import bump_catalog_version
+from seed_data import SEED_PRODUCTS, create_admin, create_indexes, reset_database
+from storage import create_client, get_database
+
+# Relative order volume per calendar month
+MONTH_WEIGHTS = [1.0, 1.3, 1.4, 0.9, 1.6, 2.4, 1.8, 1.0, 0.9, 0.8, 0.8, 0.9]
+# Monday..Sunday
+WEEKDAY_WEIGHTS = [1.0, 1.0, 1.0, 1.0, 1.1, 1.2, 0.3]
+
+# Wholesale pack sizes and how often they are ordered
+QUANTITIES = [5, 10, 12, 20, 24, 25, 50, 100, 200]
+QUANTITY_WEIGHTS = [14, 30, 8, 14, 6, 8, 12, 6, 2]
+
+GST_PERCENT = {"Notebooks": 12.0, "Paper": 12.0}
+DEFAULT_GST_PERCENT = 18.0
+BULK_TIERS = [{"min_quantity": 50, "discount_percent": 3.0}, {"min_quantity": 100, "discount_percent": 5.0}]
+
+SHOP_PREFIXES = ["City", "Students", "Smart", "Campus", "Royal", "New", "Sri", "Galaxy", "Modern", "Vidya", "Star", "Lakshmi"]
+SHOP_SUFFIXES = ["Stationery", "Book House", "Book Depot", "Paper Mart", "Office Supplies", "Traders", "Corner", "Enterprises"]
+AREAS = [
+    "MG Road", "Jayanagar", "Koramangala", "Whitefield", "Indiranagar", "HSR Layout", "Marathahalli",
+    "BTM Layout", "Malleshwaram", "Rajajinagar", "Basavanagudi", "Yelahanka", "Hebbal", "Banashankari",
+]
+FIRST_NAMES = ["Rajesh", "Priya", "Amit", "Sneha", "Vikram", "Meera", "Arjun", "Kavita", "Suresh", "Anita", "Rahul", "Deepa"]
+LAST_NAMES = ["Kumar", "Sharma", "Patel", "Reddy", "Singh", "Joshi", "Nair", "Desai", "Rao", "Iyer", "Gowda", "Shetty"]
+BRANDS = ["Classmate", "Navneet", "Camlin", "Cello", "Reynolds", "Apsara", "Natraj", "Kangaro"]
+
+
+class Generator:
+    def __init__(self, seed: int, retailers: int, products: int, months: int, end_date: date):
+        self.rng = random.Random(seed)
+        # History ends the day before end_date; the wall clock is never read,
+        # so the same arguments always give the same data
+        self.now = datetime(end_date.year, end_date.month, end_date.day, tzinfo=timezone.utc)
+        self.start = self.now - timedelta(days=round(months * 30.44))
+
+        self.products = self._products(products)
+        self.retailers = self._retailers(retailers)
+        self.due = {r["id"]: 0.0 for r in self.retailers}
+
+        # Cumulative weights let random.choices() pick in O(log n)
+        self.retailer_weights = list(accumulate(self.rng.paretovariate(1.16) for _ in self.retailers))
+        self.product_weights = list(accumulate(1.0 / (rank + 1) ** 1.1 for rank in range(len(self.products))))
+
+        self.next_number = FIRST_INVOICE_NUMBER
+
+    def _uuid(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def _products(self, count: int):
+        created_at = self.start.isoformat()
+        products = []
+        for i in range(count):
+            base = SEED_PRODUCTS[i % len(SEED_PRODUCTS)]
+            variant = i // len(SEED_PRODUCTS)
+            name = base["product_name"] if variant == 0 else f"{base['product_name']} - {BRANDS[(variant - 1) % len(BRANDS)]}"
+            if variant > len(BRANDS):
+                name += f" #{variant}"
+            price = base["price"] if variant == 0 else round(base["price"] * self.rng.uniform(0.8, 1.4), 0)
+            products.append({
+                "id": self._uuid(),
+                "product_name": name,
+                "category": base["category"],
+                "price": price,
+                "tax_percent": GST_PERCENT.get(base["category"], DEFAULT_GST_PERCENT),
+                "price_tiers": BULK_TIERS,
+                "stock_quantity": self.rng.randint(0, 3000),
+                "unit": base["unit"],
+                "created_at": created_at,
+            })
+        # Popularity follows catalog position; shuffle so it isn't the seed order
+        self.rng.shuffle(products)
+        return products
+
+    def _retailers(self, count: int):
+        rng = self.rng
+        retailers = []
+        for i in range(count):
+            area = rng.choice(AREAS)
+            created_at = self.start - timedelta(days=rng.randint(0, 365))
+            retailers.append({
+                "id": self._uuid(),
+                "shop_name": f"{rng.choice(SHOP_PREFIXES)} {rng.choice(SHOP_SUFFIXES)} {area} {i + 1}",
+                "owner_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                "phone_number": f"9{rng.randrange(10 ** 9):09d}",
+                "address": f"{area}, Bangalore",
+                "total_due": 0.0,
+                "created_at": created_at.isoformat(),
+            })
+        return retailers
+
+    def invoices_per_day(self, total: int):
+        """Spread `total` invoices over the date range by season and weekday."""
+        days = [self.start + timedelta(days=d) for d in range((self.now - self.start).days)]
+        weights = [
+            MONTH_WEIGHTS[day.month - 1] * WEEKDAY_WEIGHTS[day.weekday()] / monthrange(day.year, day.month)[1]
+            for day in days
+        ]
+        scale = total / sum(weights)
+        counts = [int(w * scale) for w in weights]
+        for index in self.rng.choices(range(len(days)), weights=weights, k=total - sum(counts)):
+            counts[index] += 1
+        return zip(days, counts)
+
+    def _line(self, product: dict, quantity: int):
+        discount = max((t["discount_percent"] for t in product["price_tiers"] if quantity >= t["min_quantity"]), default=0.0)
+        price = round(product["price"] * (1 - discount / 100), 2)
+        subtotal = round(price * quantity, 2)
+        tax = round(subtotal * product["tax_percent"] / 100, 2)
+        return {
+            "product_id": product["id"],
+            "product_name": product["product_name"],
+            "quantity": quantity,
+            "price": price,
+            "total": round(subtotal + tax, 2),
+            "discount_percent": discount,
+            "tax_amount": tax,
+        }
+
+    def _payments(self, invoice: dict, invoice_date: datetime, paid_amount: float):
+        """Split the paid amount into 1-3 installments between the invoice date and now."""
+        rng = self.rng
+        installments = 1 if paid_amount < 500 else rng.choice([1, 1, 2, 3])
+        shares = sorted(rng.random() for _ in range(installments - 1))
+        amounts = [round(paid_amount * (b - a), 2) for a, b in zip([0.0] + shares, shares + [1.0])]
+        amounts[-1] = round(paid_amount - sum(amounts[:-1]), 2)
+
+        window = max((self.now - invoice_date).total_seconds(), 1)
+        paid_at = invoice_date
+        payments = []
+        for n, amount in enumerate(amounts):
+            if n:
+                paid_at += timedelta(seconds=rng.uniform(0, window / installments))
+            payments.append({
+                "id": self._uuid(),
+                "invoice_id": invoice["id"],
+                "invoice_number": invoice["invoice_number"],
+                "retailer_name": invoice["retailer_name"],
+                "amount": amount,
+                "payment_date": paid_at.isoformat(),
+                "notes": "Initial payment" if n == 0 else f"Installment {n + 1}",
+            })
+        return payments
+
+    def invoices_for_day(self, day: datetime, count: int, compact: bool):
+        rng = self.rng
+        retailers = rng.choices(self.retailers, cum_weights=self.retailer_weights, k=count)
+        times = sorted(rng.uniform(9 * 3600, 20 * 3600) for _ in range(count))
+        age_days = (self.now - day).days
+
+        invoices, payments = [], []
+        for retailer, seconds in zip(retailers, times):
+            invoice_date = day + timedelta(seconds=seconds)
+            line_count = min(1 + int(rng.expovariate(0.35)), 15)
+            chosen = {p["id"]: p for p in rng.choices(self.products, cum_weights=self.product_weights, k=line_count)}
+            lines = [
+                self._line(product, rng.choices(QUANTITIES, weights=QUANTITY_WEIGHTS)[0])
+                for product in chosen.values()
+            ]
+            total_amount = round(sum(line["total"] for line in lines), 2)
+
+            # The older the invoice, the more likely it has been settled
+            settled = min(0.1 + age_days / 120, 0.92)
+            roll = rng.random()
+            if roll < settled:
+                paid_amount = total_amount
+            elif roll < settled + (1 - settled) / 2:
+                paid_amount = round(total_amount * rng.uniform(0.1, 0.9), 2)
+            else:
+                paid_amount = 0.0
+            due_amount = round(total_amount - paid_amount, 2)
+            status = "paid" if due_amount == 0 else "partial" if paid_amount > 0 else "unpaid"
+
+            invoice = {
+                "id": self._uuid(),
+                "invoice_number": format_invoice_number(self.next_number),
+                "retailer_id": retailer["id"],
+                "retailer_name": retailer["shop_name"],
+                "total_amount": total_amount,
+                "paid_amount": paid_amount,
+                "due_amount": due_amount,
+                "status": status,
+                "invoice_date": invoice_date.isoformat(),
+                "created_at": invoice_date.isoformat(),
+            }
+            if compact:
+                invoice["lines"] = encode_line_items(lines)
+            else:
+                invoice["products"] = lines
+            self.next_number += 1
+            self.due[retailer["id"]] += due_amount
+
+            invoices.append(invoice)
+            if paid_amount > 0:
+                payments.extend(self._payments(invoice, invoice_date, paid_amount))
+        return invoices, payments
+
+
+class BulkLoader:
+    """Runs up to `concurrency` insert_many calls at once."""
+
+    def __init__(self, db, concurrency: int):
+        self.db = db
+        self.slots = asyncio.Semaphore(concurrency)
+        self.tasks = set()
+        self.inserted = {}
+        self.errors = []
+
+    async def submit(self, collection: str, documents: list):
+        # A failed batch makes everything loaded after it pointless
+        if self.errors:
+            raise self.errors[0]
+        # Waiting for a free slot here keeps generation from running ahead of
+        # the database and holding every batch in memory
+        await self.slots.acquire()
+        task = asyncio.create_task(self._insert(collection, documents))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _insert(self, collection: str, documents: list):
+        try:
+            await self.db[collection].insert_many(documents, ordered=False)
+            self.inserted[collection] = self.inserted.get(collection, 0) + len(documents)
+        except Exception as exc:
+            # Finished tasks leave self.tasks, so drain() can't see this
+            # exception unless it is kept here
+            self.errors.append(exc)
+        finally:
+            self.slots.release()
+
+    async def drain(self):
+        """Wait for every submitted batch; raise the first insert failure."""
+        if self.tasks:
+            await asyncio.gather(*self.tasks)
+        if self.errors:
+            raise self.errors[0]
+
+
+async def generate(args):
+    client = create_client()
+    db = get_database(client)
+    compact = os.environ.get("INVOICE_LINE_ENCODING", "full").lower() == "compact"
+
+    await reset_database(db)
+    await create_admin(db)
+
+    started = time.perf_counter()
+    generator = Generator(args.seed, args.retailers, args.products, args.months, args.end_date)
+    await db.products.insert_many(generator.products)
+    await bump_catalog_version(db)
+    print(f"Created {len(generator.products)} products")
+
+    loader = BulkLoader(db, args.concurrency)
+    invoice_batch, payment_batch = [], []
+    for day, count in generator.invoices_per_day(args.invoices):
+        if not count:
+            continue
+        invoices, payments = generator.invoices_for_day(day, count, compact)
+        invoice_batch.extend(invoices)
+        payment_batch.extend(payments)
+        if len(invoice_batch) >= args.batch_size:
+            await loader.submit("invoices", invoice_batch)
+            invoice_batch = []
+            print(f"  {day.date()}  {generator.next_number - FIRST_INVOICE_NUMBER}/{args.invoices} invoices")
+        if len(payment_batch) >= args.batch_size:
+            await loader.submit("payments", payment_batch)
+            payment_batch = []
+        # Let finished inserts hand their slots back
+        await asyncio.sleep(0)
+    if invoice_batch:
+        await loader.submit("invoices", invoice_batch)
+    if payment_batch:
+        await loader.submit("payments", payment_batch)
+    await loader.drain()
+    await set_invoice_counter(db, generator.next_number - 1)
+
+    for retailer in generator.retailers:
+        retailer["total_due"] = round(generator.due[retailer["id"]], 2)
+    for i in range(0, len(generator.retailers), args.batch_size):
+        await loader.submit("retailers", generator.retailers[i:i + args.batch_size])
+    await loader.drain()
+    loaded = time.perf_counter() - started
+    print(
+        f"Loaded {loader.inserted.get('retailers', 0)} retailers, {loader.inserted.get('invoices', 0)} invoices "
+        f"and {loader.inserted.get('payments', 0)} payments in {loaded:.1f}s "
+        f"({loader.inserted.get('invoices', 0) / loaded:.0f} invoices/s)"
+    )
+
+    await create_indexes(db)
+    print(f"Built indexes in {time.perf_counter() - started - loaded:.1f}s")
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--retailers', type=int, default=200, help='number of retailers')
+    parser.add_argument('--products', type=int, default=100, help='catalog size (seed products plus brand variants)')
+    parser.add_argument('--invoices', type=int, default=10000, help='number of invoices')
+    parser.add_argument('--months', type=int, default=12, help='months of history before --end-date')
+    parser.add_argument('--end-date', type=date.fromisoformat, default=datetime.now(timezone.utc).date(),
+                        help='YYYY-MM-DD; history ends the day before (default: today)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='documents per insert_many')
+    parser.add_argument('--concurrency', type=int, default=4, help='insert_many calls in flight')
+    parser.add_argument('--seed', type=int, default=42, help='random seed; same seed and --end-date, same data')
+    args = parser.parse_args()
+    if args.retailers < 1 or args.products < 1 or args.invoices < 0 or args.months < 1:
+        parser.error("--retailers, --products and --months must be positive")
+
+    load_dotenv()
+    asyncio.run(generate(args))
+
+
+if __name__ == "__main__":
+    main()
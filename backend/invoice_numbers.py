@@ -0,0 +1,60 @@
+"""
+Invoice Numbers
+Invoice numbers come from a counter document (`counters`, _id
+"invoice_number") that is incremented atomically, so concurrent requests and
+API workers never hand out the same number. Sorting invoice_number as a
+string can't be used to find the latest one: "INV-9999" sorts after
+"INV-10000".
+
+Bulk loaders (seed_data.py, generate_data.py) set the counter to the last
+number they wrote. A database created before the counter existed gets it on
+the first new invoice, from one scan of the existing numbers.
+"""
+
+COUNTERS_COLLECTION = "counters"
+INVOICE_COUNTER_ID = "invoice_number"
+FIRST_INVOICE_NUMBER = 1001
+
+
+def format_invoice_number(number: int) -> str:
+    return f"INV-{number}"
+
+
+async def set_invoice_counter(db, last_number: int):
+    """Record the last invoice number written by a bulk load."""
+    await db[COUNTERS_COLLECTION].update_one(
+        {"_id": INVOICE_COUNTER_ID},
+        {"$set": {"seq": last_number}},
+        upsert=True
+    )
+
+
+async def _highest_existing_number(db) -> int:
+    highest = FIRST_INVOICE_NUMBER - 1
+    async for invoice in db.invoices.find({}, {"_id": 0, "invoice_number": 1}):
+        try:
+            highest = max(highest, int(invoice["invoice_number"].split("-")[1]))
+        except (KeyError, IndexError, ValueError):
+            continue
+    return highest
+
+
+async def next_invoice_number(db) -> str:
+    from pymongo import ReturnDocument
+
+    counters = db[COUNTERS_COLLECTION]
+    increment = {"$inc": {"seq": 1}}
+    counter = await counters.find_one_and_update(
+        {"_id": INVOICE_COUNTER_ID}, increment, return_document=ReturnDocument.AFTER
+    )
+    if counter is None:
+        try:
+            await counters.insert_one({"_id": INVOICE_COUNTER_ID, "seq": await _highest_existing_number(db)})
+        except Exception:
+            # Another request or worker created the counter first
+            if await counters.find_one({"_id": INVOICE_COUNTER_ID}) is None:
+                raise
+        counter = await counters.find_one_and_update(
+            {"_id": INVOICE_COUNTER_ID}, increment, return_document=ReturnDocument.AFTER
+        )
+    return format_invoice_number(counter["seq"])
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, ConfigDict, validator
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, model_validator, validator
+from typing import Any, List, Optional
 from datetime import datetime, timezone
 from enum import Enum
 
@@ -30,12 +30,14 @@ class RetailerCreate(BaseModel):
     owner_name: str
     phone_number: str
     address: str
+    email: Optional[str] = None
 
 class RetailerUpdate(BaseModel):
     shop_name: Optional[str] = None
     owner_name: Optional[str] = None
     phone_number: Optional[str] = None
     address: Optional[str] = None
+    email: Optional[str] = None
 
 class Retailer(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -44,16 +46,23 @@ class Retailer(BaseModel):
     owner_name: str
     phone_number: str
     address: str
+    email: Optional[str] = None
     total_due: float = 0.0
     created_at: datetime
 
 # Product Models
+class PriceTier(BaseModel):
+    min_quantity: int
+    discount_percent: float
+
 class ProductCreate(BaseModel):
     product_name: str
     category: str
     price: float
     stock_quantity: int
     unit: str
+    tax_percent: float = 0.0
+    price_tiers: List[PriceTier] = []
 
 class ProductUpdate(BaseModel):
     product_name: Optional[str] = None
@@ -61,6 +70,8 @@ class ProductUpdate(BaseModel):
     price: Optional[float] = None
     stock_quantity: Optional[int] = None
     unit: Optional[str] = None
+    tax_percent: Optional[float] = None
+    price_tiers: Optional[List[PriceTier]] = None
 
 class Product(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -70,6 +81,8 @@ class Product(BaseModel):
     price: float
     stock_quantity: int
     unit: str
+    tax_percent: float = 0.0
+    price_tiers: List[PriceTier] = []
     created_at: datetime
 
 # Invoice Models
@@ -79,10 +92,75 @@ class InvoiceProduct(BaseModel):
     quantity: int
     price: float
     total: float
+    discount_percent: float = 0.0
+    tax_amount: float = 0.0
+
+# Compact line-item encoding: instead of a list of full-key subdocuments,
+# invoices can store `lines` as parallel arrays, with product names kept once
+# in `names` and referenced by index from `n` (omitted when every line has a
+# distinct name). Discount/tax arrays are omitted when all zero.
+#   {"v": 1, "pid": [...], "q": [...], "p": [...], "t": [...],
+#    "d": [...], "x": [...], "names": [...], "n": [...]}
+LINE_ENCODING_VERSION = 1
+
+def encode_line_items(products: List[dict]) -> dict:
+    names = []
+    name_index = {}
+    refs = []
+    for product in products:
+        name = product["product_name"]
+        if name not in name_index:
+            name_index[name] = len(names)
+            names.append(name)
+        refs.append(name_index[name])
+
+    lines = {
+        "v": LINE_ENCODING_VERSION,
+        "pid": [p["product_id"] for p in products],
+        "q": [p["quantity"] for p in products],
+        "p": [p["price"] for p in products],
+        "t": [p["total"] for p in products],
+        "names": names,
+    }
+    discounts = [p.get("discount_percent", 0.0) for p in products]
+    if any(discounts):
+        lines["d"] = discounts
+    taxes = [p.get("tax_amount", 0.0) for p in products]
+    if any(taxes):
+        lines["x"] = taxes
+    if len(names) != len(products):
+        lines["n"] = refs
+    return lines
+
+def decode_line_items(lines: dict) -> List[dict]:
+    names = lines["names"]
+    refs = lines.get("n") or range(len(lines["pid"]))
+    count = len(lines["pid"])
+    discounts = lines.get("d") or [0.0] * count
+    taxes = lines.get("x") or [0.0] * count
+    return [
+        {
+            "product_id": product_id,
+            "product_name": names[ref],
+            "quantity": quantity,
+            "price": price,
+            "total": total,
+            "discount_percent": discount,
+            "tax_amount": tax,
+        }
+        for product_id, ref, quantity, price, total, discount, tax in zip(
+            lines["pid"], refs, lines["q"], lines["p"], lines["t"], discounts, taxes
+        )
+    ]
+
+class InvoiceLineCreate(BaseModel):
+    # Prices come from the catalog; any price/total sent by the client is ignored
+    product_id: str
+    quantity: int
 
 class InvoiceCreate(BaseModel):
     retailer_id: str
-    products: List[InvoiceProduct]
+    products: List[InvoiceLineCreate]
     paid_amount: float = 0.0
     notes: Optional[str] = None
 
@@ -101,6 +179,22 @@ class Invoice(BaseModel):
     notes: Optional[str] = None
     created_at: datetime
 
+    @model_validator(mode="before")
+    @classmethod
+    def decode_compact_lines(cls, data):
+        if isinstance(data, dict) and "lines" in data and "products" not in data:
+            data = {**data, "products": decode_line_items(data["lines"])}
+        return data
+
+class QuoteRequest(BaseModel):
+    products: List[InvoiceLineCreate]
+
+class Quote(BaseModel):
+    products: List[InvoiceProduct]
+    subtotal: float
+    tax_total: float
+    total_amount: float
+
 # Payment Models
 class PaymentCreate(BaseModel):
     invoice_id: str
@@ -126,6 +220,76 @@ class DashboardStats(BaseModel):
     low_stock_products: List[Product]
     recent_invoices: List[Invoice]
 
+# Report Models
+class ProductSales(BaseModel):
+    product_id: str
+    product_name: str
+    category: str
+    quantity: int
+    revenue: float
+    invoice_count: int
+
+class CategorySales(BaseModel):
+    category: str
+    retailer_id: str
+    retailer_name: str
+    quantity: int
+    revenue: float
+
+# Audit Models
+class AuditEvent(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    actor: str
+    action: str
+    entity: str
+    entity_id: str
+    changes: Optional[dict] = None
+    timestamp: datetime
+
+# Profiler Models
+class ProfilerSettings(BaseModel):
+    enabled: bool = False
+    sample_rate: float = Field(0.1, ge=0.0, le=1.0)
+    capacity: int = Field(20, ge=1, le=1000)
+    interval_ms: float = Field(5.0, ge=1.0, le=1000.0)
+
+class ProfilerSettingsUpdate(BaseModel):
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = Field(None, ge=0.0, le=1.0)
+    capacity: Optional[int] = Field(None, ge=1, le=1000)
+    interval_ms: Optional[float] = Field(None, ge=1.0, le=1000.0)
+
+class ProfilerStatus(ProfilerSettings):
+    profiled_requests: int
+    stored_profiles: int
+
+class ProfileSummary(BaseModel):
+    id: str
+    method: str
+    path: str
+    status_code: Optional[int] = None
+    started_at: datetime
+    duration_ms: float
+    sample_count: int
+    mongo_command_count: int
+
+# Batch Models
+class BatchOperation(BaseModel):
+    method: str = "GET"
+    path: str
+    body: Optional[Any] = None
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+class BatchResult(BaseModel):
+    status: int
+    body: Any = None
+
+class BatchResponse(BaseModel):
+    results: List[BatchResult]
+
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
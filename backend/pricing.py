@@ -0,0 +1,159 @@
+"""
+Pricing Engine
+Keeps catalog prices, quantity-tier discounts and tax rates in a compact
+in-memory table so an order can be priced in one vectorized pass without a
+database lookup per line. Every catalog change stamps a new version in
+`catalog_state`. Each worker compares that version before pricing and
+rebuilds its table when it differs, so prices changed by another worker or
+by the seed scripts take effect everywhere.
+"""
+import asyncio
+import uuid
+from functools import lru_cache
+from typing import List
+
+from models import InvoiceLineCreate, Quote
+
+
+CATALOG_STATE_ID = "catalog"
+
+
+async def bump_catalog_version(db):
+    """Mark the catalog as changed so every worker rebuilds its price table."""
+    await db.catalog_state.update_one(
+        {"_id": CATALOG_STATE_ID},
+        {"$set": {"version": str(uuid.uuid4())}},
+        upsert=True
+    )
+
+
+async def catalog_version(db):
+    state = await db.catalog_state.find_one({"_id": CATALOG_STATE_ID})
+    return state["version"] if state else None
+
+
+class UnknownProductError(LookupError):
+    def __init__(self, product_id: str):
+        super().__init__(product_id)
+        self.product_id = product_id
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+    # numpy is only needed once an order is priced, not at worker startup
+    import numpy
+    return numpy
+
+
+class PriceTable:
+    """Column-oriented snapshot of the product catalog."""
+
+    def __init__(self, products: List[dict]):
+        np = _numpy()
+        count = len(products)
+        max_tiers = max((len(p.get("price_tiers") or []) for p in products), default=0) or 1
+
+        self.index = {p["id"]: i for i, p in enumerate(products)}
+        self.names = [p["product_name"] for p in products]
+        self.prices = np.array([p["price"] for p in products], dtype=np.float64)
+        self.tax_percent = np.array([p.get("tax_percent", 0.0) for p in products], dtype=np.float64)
+
+        # One row per product, one column per tier. Unused tier slots get an
+        # unreachable threshold so they never apply.
+        self.tier_min = np.full((count, max_tiers), np.inf)
+        self.tier_discount = np.zeros((count, max_tiers))
+        for row, product in enumerate(products):
+            for col, tier in enumerate(product.get("price_tiers") or []):
+                self.tier_min[row, col] = tier["min_quantity"]
+                self.tier_discount[row, col] = tier["discount_percent"]
+
+    def __len__(self):
+        return len(self.index)
+
+    def quote(self, lines: List[InvoiceLineCreate]) -> Quote:
+        np = _numpy()
+        try:
+            rows = np.fromiter((self.index[line.product_id] for line in lines), dtype=np.intp, count=len(lines))
+        except KeyError as exc:
+            raise UnknownProductError(exc.args[0]) from None
+        quantities = np.fromiter((line.quantity for line in lines), dtype=np.float64, count=len(lines))
+
+        # Best tier reached by each line's quantity
+        reached = quantities[:, None] >= self.tier_min[rows]
+        discount = np.where(reached, self.tier_discount[rows], 0.0).max(axis=1, initial=0.0)
+
+        unit_price = np.round(self.prices[rows] * (1.0 - discount / 100.0), 2)
+        line_subtotal = np.round(unit_price * quantities, 2)
+        line_tax = np.round(line_subtotal * self.tax_percent[rows] / 100.0, 2)
+        line_total = np.round(line_subtotal + line_tax, 2)
+
+        # Plain dicts validated in a single pydantic-core call are much cheaper
+        # than building one model per line
+        products = [
+            {
+                "product_id": line.product_id,
+                "product_name": self.names[row],
+                "quantity": line.quantity,
+                "price": price,
+                "total": total,
+                "discount_percent": discount_percent,
+                "tax_amount": tax,
+            }
+            for line, row, price, total, discount_percent, tax in zip(
+                lines, rows.tolist(), unit_price.tolist(), line_total.tolist(),
+                discount.tolist(), line_tax.tolist()
+            )
+        ]
+        subtotal = round(float(line_subtotal.sum()), 2)
+        tax_total = round(float(line_tax.sum()), 2)
+        return Quote.model_validate({
+            "products": products,
+            "subtotal": subtotal,
+            "tax_total": tax_total,
+            "total_amount": round(subtotal + tax_total, 2),
+        })
+
+
+class PricingEngine:
+    """Lazily loads the price table and rebuilds it when the catalog version changes."""
+
+    def __init__(self):
+        self._table = None
+        self._version = None
+        self._lock = asyncio.Lock()
+
+    async def get_table(self, db) -> PriceTable:
+        # One _id lookup per order keeps workers in step with each other
+        version = await catalog_version(db)
+        if self._table is None or version != self._version:
+            await self.refresh(db, version)
+        return self._table
+
+    async def refresh(self, db, version=None):
+        async with self._lock:
+            # Read the version before the products: if the catalog changes in
+            # between, the next check sees a newer version and rebuilds again
+            if version is None:
+                version = await catalog_version(db)
+            products = await db.products.find(
+                {},
+                {"_id": 0, "id": 1, "product_name": 1, "price": 1, "tax_percent": 1, "price_tiers": 1}
+            ).to_list(None)
+            self._table = PriceTable(products)
+            self._version = version
+
+    async def catalog_changed(self, db):
+        """Publish a catalog change to all workers and rebuild this one's table."""
+        await bump_catalog_version(db)
+        await self.refresh(db)
+
+    def invalidate(self):
+        self._table = None
+
+    async def quote(self, db, lines: List[InvoiceLineCreate]) -> Quote:
+        table = await self.get_table(db)
+        return table.quote(lines)
+
+
+def warm_up():
+    _numpy()
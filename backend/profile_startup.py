@@ -0,0 +1,113 @@
+"""
+Startup Profile
+Reports per-module import time for server.py and measures the cold start of
+`uvicorn server:app` against a time budget.
+
+Usage:
+    python profile_startup.py                 # import profile + cold start
+    python profile_startup.py --top 40        # show more modules
+    python profile_startup.py --budget 0.8    # fail if cold start > 0.8s
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+DEFAULT_BUDGET = float(os.environ.get('COLD_START_BUDGET', '1.0'))
+
+
+def profile_imports(top=25):
+    """Import server.py in a fresh interpreter with -X importtime."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import server'],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr)
+        raise SystemExit('[ERROR] Importing server.py failed')
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_part, cumulative_part, name = line[len('import time:'):].split('|', 2)
+        # Nested imports are indented by two spaces per level after the bar
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((int(cumulative_part), int(self_part), name.strip(), depth))
+
+    total_us = sum(r[0] for r in rows if r[3] == 0)
+
+    print("=" * 60)
+    print("Import time by module (cumulative, top %d)" % top)
+    print("=" * 60)
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for cumulative_us, self_us, name, _ in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>10.1f}ms {self_us / 1000:>8.1f}ms  {name}")
+    print(f"\nTotal import time: {total_us / 1000:.1f}ms")
+    return total_us / 1_000_000
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure_cold_start(timeout=30.0):
+    """Start uvicorn and time how long until /api/health answers."""
+    port = _free_port()
+    url = f'http://127.0.0.1:{port}/api/health'
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'server:app',
+         '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        cwd=ROOT_DIR,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                raise SystemExit('[ERROR] uvicorn exited during startup')
+            try:
+                with urllib.request.urlopen(url, timeout=0.5) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise SystemExit(f'[ERROR] Server not ready after {timeout:.0f}s')
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=25, help='number of modules to list')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET, help='cold start budget in seconds')
+    parser.add_argument('--skip-server', action='store_true', help='only profile imports')
+    args = parser.parse_args()
+
+    profile_imports(args.top)
+
+    if args.skip_server:
+        return
+
+    cold_start = measure_cold_start()
+    print("\n" + "=" * 60)
+    print(f"Cold start (spawn -> first 200 on /api/health): {cold_start * 1000:.0f}ms")
+    print(f"Budget: {args.budget * 1000:.0f}ms")
+    print("=" * 60)
+    if cold_start > args.budget:
+        print("[FAIL] Cold start is over budget")
+        sys.exit(1)
+    print("[OK] Cold start is within budget")
+
+
+if __name__ == "__main__":
+    main()
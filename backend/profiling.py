@@ -0,0 +1,253 @@
+"""
+Request Profiler
+Samples a configurable fraction of requests with a background stack sampler
+and keeps the slowest profiles, together with the MongoDB commands each
+request issued. Profiles can be downloaded as collapsed stacks (for
+flamegraph.pl / speedscope) or speedscope JSON.
+
+Sampling reads the event loop thread's current frame every few milliseconds
+from a separate thread, so unprofiled requests pay nothing and profiled ones
+only pay for the sampler's wakeups. Requests that overlap on the event loop
+share samples taken while they were both in flight.
+"""
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+
+IDLE_FRAME = "<event loop idle>"
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename.replace("\\", "/")
+    for marker in ("site-packages/", "lib/python"):
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    else:
+        filename = filename.rsplit("/", 1)[-1]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    # A loop blocked in select() is waiting on I/O (e.g. MongoDB)
+    if labels and labels[-1].startswith(("select (", "poll (")):
+        labels.append(IDLE_FRAME)
+    return ";".join(labels)
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.started_at = datetime.now(timezone.utc)
+        self.status_code = None
+        self.duration_ms = 0.0
+        self.stacks = Counter()
+        self.mongo_commands = []
+        self._pending_commands = {}
+        self._started = time.perf_counter()
+
+    @property
+    def sample_count(self) -> int:
+        return sum(self.stacks.values())
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status_code": self.status_code,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "sample_count": self.sample_count,
+            "mongo_command_count": len(self.mongo_commands),
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            **self.summary(),
+            "mongo_commands": self.mongo_commands,
+            "stacks": [{"stack": stack, "count": count} for stack, count in self.stacks.most_common()],
+        }
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def speedscope(self, interval_ms: float) -> dict:
+        frames = []
+        frame_index = {}
+        samples = []
+        weights = []
+        for stack, count in self.stacks.items():
+            sample = []
+            for label in stack.split(";"):
+                if label not in frame_index:
+                    frame_index[label] = len(frames)
+                    frames.append({"name": label})
+                sample.append(frame_index[label])
+            samples.append(sample)
+            weights.append(count * interval_ms)
+        name = f"{self.method} {self.path} ({self.duration_ms:.1f} ms)"
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "invoicehub-profiler",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+
+class _MongoCommandListener:
+    """Attributes MongoDB commands to the profile of the request that issued them.
+
+    Wrapped in a pymongo CommandListener by Profiler.command_listeners(), so
+    pymongo is only imported when the MongoDB backend is in use.
+    """
+
+    def started(self, event):
+        profile = _current_profile.get()
+        if profile is not None:
+            collection = event.command.get(event.command_name)
+            profile._pending_commands[event.request_id] = {
+                "command": event.command_name,
+                "collection": collection if isinstance(collection, str) else None,
+                "database": event.database_name,
+            }
+
+    def _finish(self, event, ok: bool):
+        profile = _current_profile.get()
+        if profile is None:
+            return
+        command = profile._pending_commands.pop(event.request_id, None)
+        if command is not None:
+            command["duration_ms"] = event.duration_micros / 1000
+            command["ok"] = ok
+            profile.mongo_commands.append(command)
+
+    def succeeded(self, event):
+        self._finish(event, True)
+
+    def failed(self, event):
+        self._finish(event, False)
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = os.environ.get("PROFILER_ENABLED", "false").lower() == "true"
+        self.sample_rate = float(os.environ.get("PROFILER_SAMPLE_RATE", "0.1"))
+        self.capacity = int(os.environ.get("PROFILER_CAPACITY", "20"))
+        self.interval_ms = float(os.environ.get("PROFILER_INTERVAL_MS", "5"))
+        self.profiled_requests = 0
+
+        self._lock = threading.Lock()
+        self._active = set()
+        # Min-heap on duration holding the N slowest profiles
+        self._slowest = []
+        self._sequence = itertools.count()
+        self._loop_thread_id = None
+        self._sampler = None
+
+    def command_listeners(self):
+        from pymongo import monitoring
+
+        class CommandListener(_MongoCommandListener, monitoring.CommandListener):
+            pass
+
+        return [CommandListener()]
+
+    def configure(self, enabled: bool, sample_rate: float, capacity: int, interval_ms: float):
+        with self._lock:
+            self.enabled = enabled
+            self.sample_rate = sample_rate
+            self.interval_ms = interval_ms
+            self.capacity = capacity
+            while len(self._slowest) > capacity:
+                heapq.heappop(self._slowest)
+
+    def settings(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "capacity": self.capacity,
+            "interval_ms": self.interval_ms,
+        }
+
+    def should_profile(self) -> bool:
+        return self.enabled and random.random() < self.sample_rate
+
+    def start(self, method: str, path: str):
+        profile = RequestProfile(method, path)
+        token = _current_profile.set(profile)
+        with self._lock:
+            self._loop_thread_id = threading.get_ident()
+            self._active.add(profile)
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+                self._sampler.start()
+        return profile, token
+
+    def finish(self, profile: RequestProfile, token, status_code):
+        profile.duration_ms = (time.perf_counter() - profile._started) * 1000
+        profile.status_code = status_code
+        _current_profile.reset(token)
+        with self._lock:
+            self._active.discard(profile)
+            self.profiled_requests += 1
+            entry = (profile.duration_ms, next(self._sequence), profile)
+            if len(self._slowest) < self.capacity:
+                heapq.heappush(self._slowest, entry)
+            elif profile.duration_ms > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def profiles(self):
+        with self._lock:
+            return [entry[2] for entry in sorted(self._slowest, reverse=True)]
+
+    def get(self, profile_id: str):
+        return next((p for p in self.profiles() if p.id == profile_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._slowest = []
+
+    def _sample_loop(self):
+        # Exits once no profiled request is in flight; start() restarts it
+        while True:
+            time.sleep(self.interval_ms / 1000)
+            with self._lock:
+                if not self._active:
+                    self._sampler = None
+                    return
+                active = list(self._active)
+                thread_id = self._loop_thread_id
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                continue
+            stack = _collapse(frame)
+            del frame
+            for profile in active:
+                profile.stacks[stack] += 1
@@ -0,0 +1,449 @@
+"""
+Payment Reminders
+Finds retailers with overdue unpaid/partial invoices and sends each one a
+reminder through a pluggable transport:
+
+- log:     writes reminders to the log and keeps them in memory (default,
+           also used in tests)
+- webhook: POSTs JSON to REMINDER_WEBHOOK_URL (SMS gateways, WhatsApp
+           bridges, etc.)
+- smtp:    emails retailers that have an email address
+
+A bounded pool of async workers sends reminders concurrently with retry and
+exponential backoff. Before sending, a worker claims the retailer in
+`reminder_log` (keyed by retailer id) for the cooldown window with a
+conditional update. When several API workers run the scheduler, only one of
+them reminds each retailer, and repeated runs never spam anyone.
+
+Usage:
+    python reminders.py              # send reminders once
+    python reminders.py --dry-run    # only list who would be reminded
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime, timezone, timedelta
+from string import Template
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+REMINDER_LOG_COLLECTION = "reminder_log"
+
+# Invoice numbers listed in a reminder; the rest are summarised as "and more"
+MAX_LISTED_INVOICES = 10
+
+DEFAULT_TEMPLATE = (
+    "Dear $owner_name, this is a reminder from S K NoteBook that $shop_name has "
+    "Rs. $total_due outstanding across $invoice_count invoice(s) ($invoice_numbers), "
+    "the oldest dated $oldest_invoice_date. Please arrange payment at the earliest."
+)
+
+
+async def ensure_indexes(db):
+    # reminder_log is keyed by _id (the retailer id), which is always indexed
+    await db.invoices.create_index([("status", 1), ("invoice_date", 1)])
+
+
+class PermanentDeliveryError(Exception):
+    """Delivery can never succeed (e.g. no address); do not retry."""
+
+
+class ReminderMessage:
+    def __init__(self, retailer: dict, overdue: dict, text: str):
+        self.retailer_id = retailer["id"]
+        self.shop_name = retailer["shop_name"]
+        self.phone_number = retailer.get("phone_number")
+        self.email = retailer.get("email")
+        self.total_due = round(overdue["total_due"], 2)
+        self.invoice_numbers = overdue["invoice_numbers"]
+        self.text = text
+
+    def to_dict(self) -> dict:
+        return {
+            "retailer_id": self.retailer_id,
+            "shop_name": self.shop_name,
+            "phone_number": self.phone_number,
+            "email": self.email,
+            "total_due": self.total_due,
+            "invoice_numbers": self.invoice_numbers,
+            "text": self.text,
+        }
+
+
+# =============== TRANSPORTS ===============
+
+class ReminderTransport:
+    name = "base"
+
+    async def send(self, message: ReminderMessage):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class LogTransport(ReminderTransport):
+    """Local stand-in: logs reminders and keeps them for inspection."""
+    name = "log"
+
+    def __init__(self, keep: int = 1000):
+        self.keep = keep
+        self.sent = []
+
+    async def send(self, message: ReminderMessage):
+        logger.info("Reminder to %s (%s): %s", message.shop_name, message.phone_number, message.text)
+        self.sent.append(message.to_dict())
+        del self.sent[:-self.keep]
+
+
+class WebhookTransport(ReminderTransport):
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        import httpx
+        self.url = url
+        self._client = httpx.AsyncClient(timeout=timeout)
+
+    async def send(self, message: ReminderMessage):
+        response = await self._client.post(self.url, json=message.to_dict())
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            raise PermanentDeliveryError(f"Webhook rejected reminder: HTTP {response.status_code}")
+        response.raise_for_status()
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class SMTPTransport(ReminderTransport):
+    name = "smtp"
+
+    def __init__(self, host: str, port: int, sender: str, username: Optional[str] = None,
+                 password: Optional[str] = None, use_tls: bool = True):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+
+    def _send_sync(self, message: ReminderMessage):
+        import smtplib
+        from email.message import EmailMessage
+
+        email = EmailMessage()
+        email["From"] = self.sender
+        email["To"] = message.email
+        email["Subject"] = f"Payment reminder: Rs. {message.total_due} outstanding"
+        email.set_content(message.text)
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(email)
+
+    async def send(self, message: ReminderMessage):
+        if not message.email:
+            raise PermanentDeliveryError(f"{message.shop_name} has no email address")
+        await asyncio.to_thread(self._send_sync, message)
+
+
+def transport_from_env() -> ReminderTransport:
+    kind = os.environ.get("REMINDER_TRANSPORT", "log").lower()
+    if kind == "webhook":
+        return WebhookTransport(os.environ["REMINDER_WEBHOOK_URL"])
+    if kind == "smtp":
+        return SMTPTransport(
+            host=os.environ["SMTP_HOST"],
+            port=int(os.environ.get("SMTP_PORT", "587")),
+            sender=os.environ["SMTP_SENDER"],
+            username=os.environ.get("SMTP_USERNAME"),
+            password=os.environ.get("SMTP_PASSWORD"),
+            use_tls=os.environ.get("SMTP_TLS", "true").lower() == "true",
+        )
+    if kind == "log":
+        return LogTransport()
+    raise ValueError(f"Unknown REMINDER_TRANSPORT: {kind!r}")
+
+
+# =============== DISPATCHER ===============
+
+class ReminderDispatcher:
+    def __init__(self, transport: Optional[ReminderTransport] = None):
+        self.enabled = os.environ.get("REMINDERS_ENABLED", "false").lower() == "true"
+        self.interval = timedelta(hours=float(os.environ.get("REMINDER_INTERVAL_HOURS", "24")))
+        self.overdue_days = int(os.environ.get("REMINDER_OVERDUE_DAYS", "15"))
+        self.cooldown = timedelta(hours=float(os.environ.get("REMINDER_COOLDOWN_HOURS", "72")))
+        self.workers = int(os.environ.get("REMINDER_WORKERS", "16"))
+        self.max_attempts = int(os.environ.get("REMINDER_MAX_ATTEMPTS", "4"))
+        self.retry_base_delay = float(os.environ.get("REMINDER_RETRY_BASE_SECONDS", "1.0"))
+        self.template = Template(os.environ.get("REMINDER_TEMPLATE", DEFAULT_TEMPLATE))
+        self._transport = transport
+
+        self.last_run = None
+        self.totals = {"runs": 0, "sent": 0, "failed": 0, "retries": 0}
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    @property
+    def transport(self) -> ReminderTransport:
+        if self._transport is None:
+            self._transport = transport_from_env()
+        return self._transport
+
+    def start(self, db):
+        if self.enabled:
+            self._task = asyncio.create_task(self._schedule(db))
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._transport:
+            await self._transport.close()
+
+    async def _schedule(self, db):
+        while True:
+            try:
+                await self.run(db)
+            except Exception:
+                logger.exception("Reminder run failed")
+            await asyncio.sleep(self.interval.total_seconds())
+
+    def _overdue_filter(self, now: datetime) -> dict:
+        cutoff = (now - timedelta(days=self.overdue_days)).isoformat()
+        return {
+            "status": {"$in": ["unpaid", "partial"]},
+            "invoice_date": {"$lte": cutoff},
+            "due_amount": {"$gt": 0},
+        }
+
+    async def _overdue_by_retailer(self, db, now: datetime) -> dict:
+        """Per-retailer overdue totals: total_due, invoice_count, oldest date and numbers."""
+        if getattr(db, "supports_aggregation", True):
+            pipeline = [
+                {"$match": self._overdue_filter(now)},
+                {"$sort": {"invoice_date": 1}},
+                {"$group": {
+                    "_id": "$retailer_id",
+                    "total_due": {"$sum": "$due_amount"},
+                    "invoice_count": {"$sum": 1},
+                    "oldest_invoice_date": {"$first": "$invoice_date"},
+                    "invoice_numbers": {"$push": "$invoice_number"},
+                }},
+                {"$addFields": {"invoice_numbers": {"$slice": ["$invoice_numbers", MAX_LISTED_INVOICES + 1]}}},
+            ]
+            return {group.pop("_id"): group async for group in db.invoices.aggregate(pipeline)}
+
+        overdue = {}
+        async for invoice in db.invoices.find(
+            self._overdue_filter(now),
+            {"_id": 0, "retailer_id": 1, "invoice_number": 1, "invoice_date": 1, "due_amount": 1}
+        ).sort("invoice_date", 1):
+            group = overdue.get(invoice["retailer_id"])
+            if group is None:
+                group = overdue[invoice["retailer_id"]] = {
+                    "total_due": 0.0, "invoice_count": 0,
+                    "oldest_invoice_date": invoice["invoice_date"], "invoice_numbers": [],
+                }
+            group["total_due"] += invoice["due_amount"]
+            group["invoice_count"] += 1
+            if len(group["invoice_numbers"]) <= MAX_LISTED_INVOICES:
+                group["invoice_numbers"].append(invoice["invoice_number"])
+        return overdue
+
+    async def select_overdue(self, db, now: datetime):
+        """Overdue totals per retailer, skipping retailers still in their cooldown."""
+        overdue = await self._overdue_by_retailer(db, now)
+        if not overdue:
+            return [], 0
+
+        # Cheap pre-filter; the claim in _claim() is what actually prevents duplicates
+        recent = await db[REMINDER_LOG_COLLECTION].find(
+            {"_id": {"$in": list(overdue)}, "next_allowed_at": {"$gt": now.isoformat()}},
+            {"_id": 1}
+        ).to_list(None)
+        for entry in recent:
+            overdue.pop(entry["_id"], None)
+
+        retailers = await db.retailers.find(
+            {"id": {"$in": list(overdue)}}, {"_id": 0}
+        ).to_list(None)
+        return [(r, overdue[r["id"]]) for r in retailers], len(recent)
+
+    def render(self, retailer: dict, overdue: dict) -> ReminderMessage:
+        numbers = overdue["invoice_numbers"]
+        text = self.template.safe_substitute(
+            shop_name=retailer["shop_name"],
+            owner_name=retailer["owner_name"],
+            total_due=f"{overdue['total_due']:.2f}",
+            invoice_count=overdue["invoice_count"],
+            invoice_numbers=", ".join(numbers[:MAX_LISTED_INVOICES])
+            + (" and more" if overdue["invoice_count"] > MAX_LISTED_INVOICES else ""),
+            oldest_invoice_date=overdue["oldest_invoice_date"][:10],
+        )
+        return ReminderMessage(retailer, {**overdue, "invoice_numbers": numbers[:MAX_LISTED_INVOICES]}, text)
+
+    async def _claim(self, db, retailer_id: str, now: datetime) -> bool:
+        """Reserve a retailer for the cooldown window; False if someone else holds it."""
+        log = db[REMINDER_LOG_COLLECTION]
+        claim = {
+            "retailer_id": retailer_id,
+            "claimed_at": now.isoformat(),
+            "next_allowed_at": (now + self.cooldown).isoformat(),
+        }
+        result = await log.update_one(
+            {"_id": retailer_id, "next_allowed_at": {"$lte": now.isoformat()}},
+            {"$set": claim}
+        )
+        if result.matched_count:
+            return True
+        if await log.find_one({"_id": retailer_id}, {"_id": 1}):
+            return False
+        try:
+            await log.insert_one({"_id": retailer_id, **claim, "reminders_sent": 0})
+        except Exception:
+            # Another worker created the entry first and holds the claim
+            if await log.find_one({"_id": retailer_id}, {"_id": 1}):
+                return False
+            raise
+        return True
+
+    async def _release(self, db, retailer_id: str):
+        # Let the next run try again instead of waiting out the cooldown
+        await db[REMINDER_LOG_COLLECTION].update_one(
+            {"_id": retailer_id},
+            {"$set": {"next_allowed_at": datetime.now(timezone.utc).isoformat()}}
+        )
+
+    async def _deliver(self, db, message: ReminderMessage, stats: dict):
+        if not await self._claim(db, message.retailer_id, datetime.now(timezone.utc)):
+            stats["skipped_recent"] += 1
+            return
+
+        for attempt in range(self.max_attempts):
+            try:
+                await self.transport.send(message)
+            except PermanentDeliveryError as exc:
+                logger.warning("Reminder to %s not deliverable: %s", message.shop_name, exc)
+                stats["failed"] += 1
+                await self._release(db, message.retailer_id)
+                return
+            except Exception as exc:
+                if attempt + 1 == self.max_attempts:
+                    logger.warning("Reminder to %s failed after %d attempts: %s",
+                                   message.shop_name, self.max_attempts, exc)
+                    stats["failed"] += 1
+                    await self._release(db, message.retailer_id)
+                    return
+                stats["retries"] += 1
+                delay = self.retry_base_delay * (2 ** attempt)
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            else:
+                break
+
+        stats["sent"] += 1
+        await db[REMINDER_LOG_COLLECTION].update_one(
+            {"_id": message.retailer_id},
+            {
+                "$set": {
+                    "last_sent_at": datetime.now(timezone.utc).isoformat(),
+                    "total_due": message.total_due,
+                    "transport": self.transport.name
+                },
+                "$inc": {"reminders_sent": 1}
+            }
+        )
+
+    async def run(self, db, dry_run: bool = False) -> dict:
+        """Select overdue retailers and send their reminders. Returns run stats."""
+        if self._lock.locked():
+            raise RuntimeError("A reminder run is already in progress")
+        async with self._lock:
+            started = time.perf_counter()
+            now = datetime.now(timezone.utc)
+            targets, skipped_recent = await self.select_overdue(db, now)
+            messages = [self.render(retailer, overdue) for retailer, overdue in targets]
+
+            stats = {
+                "started_at": now.isoformat(),
+                "dry_run": dry_run,
+                "selected": len(messages),
+                "skipped_recent": skipped_recent,
+                "sent": 0,
+                "failed": 0,
+                "retries": 0,
+            }
+            if dry_run:
+                stats["preview"] = [m.to_dict() for m in messages[:20]]
+            elif messages:
+                queue = asyncio.Queue()
+                for message in messages:
+                    queue.put_nowait(message)
+
+                async def worker():
+                    while not queue.empty():
+                        await self._deliver(db, queue.get_nowait(), stats)
+
+                await asyncio.gather(*(worker() for _ in range(min(self.workers, len(messages)))))
+
+            duration = time.perf_counter() - started
+            stats["duration_seconds"] = round(duration, 3)
+            stats["per_second"] = round(stats["sent"] / duration, 1) if duration > 0 else 0.0
+
+            if not dry_run:
+                self.totals["runs"] += 1
+                for key in ("sent", "failed", "retries"):
+                    self.totals[key] += stats[key]
+                logger.info("Reminder run: %s", {k: v for k, v in stats.items() if k != "preview"})
+            self.last_run = stats
+            return stats
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "transport": os.environ.get("REMINDER_TRANSPORT", "log").lower(),
+            "interval_hours": self.interval.total_seconds() / 3600,
+            "overdue_days": self.overdue_days,
+            "cooldown_hours": self.cooldown.total_seconds() / 3600,
+            "workers": self.workers,
+            "totals": self.totals,
+            "last_run": self.last_run,
+        }
+
+
+async def main(dry_run: bool):
+    from storage import create_client, get_database
+
+    client = create_client()
+    db = get_database(client)
+    dispatcher = ReminderDispatcher()
+    try:
+        await ensure_indexes(db)
+        stats = await dispatcher.run(db, dry_run=dry_run)
+        for reminder in stats.pop("preview", []):
+            print(f"- {reminder['shop_name']}: Rs. {reminder['total_due']:.2f} ({', '.join(reminder['invoice_numbers'])})")
+        print(stats)
+    finally:
+        await dispatcher.close()
+        client.close()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help='list reminders without sending them')
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main(args.dry_run))
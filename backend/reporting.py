@@ -0,0 +1,383 @@
+"""
+Sales Reporting
+Maintains the `sales_cube` collection: one document per product, retailer
+and day (with the product's category), holding quantity, revenue and invoice
+counts. New invoices are folded in incrementally with an $unwind/$group/$merge
+aggregation, so report queries read the small cube instead of scanning
+invoices. Backends without aggregation support (the embedded SQLite store)
+get the same cube built and queried in Python.
+
+Report reads never refresh the cube themselves. A background task folds in
+new invoices every REPORT_REFRESH_INTERVAL seconds. Each refresh first
+claims its watermark range in `report_state`, so when several workers run
+the task, each invoice is counted once.
+
+Every claimed range is also recorded as a pending fold until it has been
+folded in. A fold that raised, or that is still pending after
+REPORT_FOLD_TIMEOUT_MINUTES (its worker died), leaves the cube missing
+invoices. The background task then rebuilds the cube, and until it has,
+reports are flagged stale.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+from models import decode_line_items
+
+logger = logging.getLogger(__name__)
+
+CUBE_COLLECTION = "sales_cube"
+STATE_ID = "sales_cube"
+
+# Invoices newer than this are left for the next refresh so that an invoice
+# whose created_at was stamped just before the refresh but inserted just after
+# it is never skipped.
+SETTLE_DELAY = timedelta(seconds=5)
+
+# report_state documents for claimed ranges that are not folded in yet
+FOLD_KIND = "fold"
+
+
+async def ensure_indexes(db):
+    await db.invoices.create_index("created_at")
+    await db.products.create_index("id")
+    await db[CUBE_COLLECTION].create_index([("day", 1), ("product_id", 1)])
+    await db[CUBE_COLLECTION].create_index([("retailer_id", 1), ("day", 1)])
+
+
+def _refresh_pipeline(watermark: str, upper: str):
+    return [
+        {"$match": {"created_at": {"$gt": watermark, "$lte": upper}}},
+        # Expand compact `lines` parallel arrays into line-item subdocuments
+        {"$set": {"products": {"$cond": [
+            {"$isArray": "$lines.pid"},
+            {"$map": {
+                "input": {"$range": [0, {"$size": "$lines.pid"}]},
+                "as": "i",
+                "in": {
+                    "product_id": {"$arrayElemAt": ["$lines.pid", "$$i"]},
+                    "product_name": {"$arrayElemAt": [
+                        "$lines.names",
+                        {"$ifNull": [{"$arrayElemAt": ["$lines.n", "$$i"]}, "$$i"]},
+                    ]},
+                    "quantity": {"$arrayElemAt": ["$lines.q", "$$i"]},
+                    "total": {"$arrayElemAt": ["$lines.t", "$$i"]},
+                },
+            }},
+            "$products",
+        ]}}},
+        {"$unwind": "$products"},
+        {"$group": {
+            "_id": {
+                "product_id": "$products.product_id",
+                "retailer_id": "$retailer_id",
+                "day": {"$substrBytes": ["$invoice_date", 0, 10]},
+            },
+            "product_name": {"$last": "$products.product_name"},
+            "retailer_name": {"$last": "$retailer_name"},
+            "quantity": {"$sum": "$products.quantity"},
+            "revenue": {"$sum": "$products.total"},
+            "invoice_ids": {"$addToSet": "$id"},
+        }},
+        {"$lookup": {
+            "from": "products",
+            "localField": "_id.product_id",
+            "foreignField": "id",
+            "as": "catalog",
+        }},
+        {"$project": {
+            "product_id": "$_id.product_id",
+            "retailer_id": "$_id.retailer_id",
+            "day": "$_id.day",
+            "product_name": 1,
+            "retailer_name": 1,
+            "category": {"$ifNull": [{"$arrayElemAt": ["$catalog.category", 0]}, "Uncategorized"]},
+            "quantity": 1,
+            "revenue": 1,
+            "invoice_count": {"$size": "$invoice_ids"},
+        }},
+        {"$merge": {
+            "into": CUBE_COLLECTION,
+            "on": "_id",
+            "whenMatched": [{"$set": {
+                "quantity": {"$add": ["$quantity", "$$new.quantity"]},
+                "revenue": {"$add": ["$revenue", "$$new.revenue"]},
+                "invoice_count": {"$add": ["$invoice_count", "$$new.invoice_count"]},
+                "product_name": "$$new.product_name",
+                "retailer_name": "$$new.retailer_name",
+                "category": "$$new.category",
+            }}],
+            "whenNotMatched": "insert",
+        }},
+    ]
+
+
+class SalesCube:
+    """Incrementally maintained product/category/retailer/day sales totals."""
+
+    def __init__(self):
+        self.refresh_interval = float(os.environ.get("REPORT_REFRESH_INTERVAL", "30"))
+        self.fold_timeout = timedelta(minutes=float(os.environ.get("REPORT_FOLD_TIMEOUT_MINUTES", "30")))
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def start(self, db):
+        if self.refresh_interval > 0:
+            self._task = asyncio.create_task(self._schedule(db))
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _schedule(self, db):
+        while True:
+            try:
+                if await self.repair(db) is None:
+                    await self.refresh(db)
+            except Exception:
+                logger.exception("Sales cube refresh failed")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def refresh(self, db) -> int:
+        """Fold invoices created since the last refresh into the cube.
+
+        Returns the number of invoices processed.
+        """
+        async with self._lock:
+            state = await db.report_state.find_one({"_id": STATE_ID})
+            watermark = state.get("watermark", "") if state else ""
+            upper = (datetime.now(timezone.utc) - SETTLE_DELAY).isoformat()
+
+            new_invoices = await db.invoices.count_documents(
+                {"created_at": {"$gt": watermark, "$lte": upper}}
+            )
+            if not new_invoices:
+                return 0
+
+            # Record the range as pending before claiming it, so that a claim
+            # whose fold never completes is always visible to repair()
+            fold_id = f"{STATE_ID}|{FOLD_KIND}|{uuid.uuid4().hex}"
+            await db.report_state.insert_one({
+                "_id": fold_id,
+                "kind": FOLD_KIND,
+                "from": watermark,
+                "to": upper,
+                "started_at": datetime.now(timezone.utc).isoformat(),
+            })
+
+            # Claim (watermark, upper] before folding it in. If another worker
+            # moved the watermark first, it owns these invoices.
+            if state is None:
+                await db.report_state.update_one({"_id": STATE_ID}, {"$inc": {"refreshes": 0}}, upsert=True)
+            claimed = await db.report_state.update_one(
+                {"_id": STATE_ID, "watermark": watermark if state and "watermark" in state else {"$exists": False}},
+                {
+                    "$set": {"watermark": upper, "refreshed_at": datetime.now(timezone.utc).isoformat()},
+                    "$inc": {"refreshes": 1}
+                }
+            )
+            if not claimed.matched_count:
+                await db.report_state.delete_one({"_id": fold_id})
+                return 0
+
+            try:
+                if getattr(db, "supports_aggregation", True):
+                    await db.invoices.aggregate(_refresh_pipeline(watermark, upper)).to_list(None)
+                else:
+                    await self._refresh_in_python(db, watermark, upper)
+            except Exception as exc:
+                # The watermark has moved past these invoices; leave the
+                # pending fold marked failed so repair() rebuilds the cube
+                await db.report_state.update_one({"_id": fold_id}, {"$set": {
+                    "failed_at": datetime.now(timezone.utc).isoformat(),
+                    "error": repr(exc),
+                }})
+                raise
+            await db.report_state.delete_one({"_id": fold_id})
+            return new_invoices
+
+    async def _broken_folds(self, db):
+        cutoff = (datetime.now(timezone.utc) - self.fold_timeout).isoformat()
+        failed = await db.report_state.find({"kind": FOLD_KIND, "failed_at": {"$exists": True}}).to_list(None)
+        stuck = await db.report_state.find(
+            {"kind": FOLD_KIND, "failed_at": {"$exists": False}, "started_at": {"$lt": cutoff}}
+        ).to_list(None)
+        return failed, stuck
+
+    async def repair(self, db) -> Optional[int]:
+        """Rebuild the cube if a fold failed or never finished.
+
+        Returns the number of invoices processed by the rebuild, or None when
+        nothing needed repairing (or another worker is already on it).
+        """
+        failed, stuck = await self._broken_folds(db)
+        for fold in failed + stuck:
+            # Deleting the record is the claim: only one worker rebuilds
+            if await db.report_state.find_one_and_delete({"_id": fold["_id"]}):
+                logger.warning(
+                    "Sales cube is missing invoices created in (%s, %s] (%s); rebuilding",
+                    fold["from"], fold["to"], fold.get("error", "fold did not finish")
+                )
+                return await self.rebuild(db)
+        return None
+
+    async def status(self, db) -> dict:
+        state = await db.report_state.find_one({"_id": STATE_ID}) or {}
+        failed, stuck = await self._broken_folds(db)
+        return {
+            "watermark": state.get("watermark"),
+            "refreshed_at": state.get("refreshed_at"),
+            "refreshes": state.get("refreshes", 0),
+            "refresh_interval": self.refresh_interval,
+            "stale": bool(failed or stuck),
+            "failed_folds": len(failed),
+            "stuck_folds": len(stuck),
+        }
+
+    async def _refresh_in_python(self, db, watermark: str, upper: str):
+        invoices = await db.invoices.find(
+            {"created_at": {"$gt": watermark, "$lte": upper}},
+            {"_id": 0, "id": 1, "retailer_id": 1, "retailer_name": 1, "invoice_date": 1, "products": 1, "lines": 1}
+        ).to_list(None)
+        catalog = await db.products.find({}, {"_id": 0, "id": 1, "category": 1}).to_list(None)
+        categories = {p["id"]: p["category"] for p in catalog}
+
+        groups = {}
+        for invoice in invoices:
+            day = invoice["invoice_date"][:10]
+            products = invoice["products"] if "products" in invoice else decode_line_items(invoice["lines"])
+            for line in products:
+                key = (line["product_id"], invoice["retailer_id"], day)
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = {"quantity": 0, "revenue": 0.0, "invoice_ids": set()}
+                group["product_name"] = line["product_name"]
+                group["retailer_name"] = invoice["retailer_name"]
+                group["quantity"] += line["quantity"]
+                group["revenue"] += line["total"]
+                group["invoice_ids"].add(invoice["id"])
+
+        if not groups:
+            return
+        from pymongo import UpdateOne
+        await db[CUBE_COLLECTION].bulk_write([
+            UpdateOne(
+                {"_id": f"{product_id}|{retailer_id}|{day}"},
+                {
+                    "$set": {
+                        "product_id": product_id,
+                        "retailer_id": retailer_id,
+                        "day": day,
+                        "product_name": group["product_name"],
+                        "retailer_name": group["retailer_name"],
+                        "category": categories.get(product_id, "Uncategorized"),
+                    },
+                    "$inc": {
+                        "quantity": group["quantity"],
+                        "revenue": group["revenue"],
+                        "invoice_count": len(group["invoice_ids"]),
+                    },
+                },
+                upsert=True
+            )
+            for (product_id, retailer_id, day), group in groups.items()
+        ], ordered=False)
+
+    async def rebuild(self, db) -> int:
+        """Drop the cube and rebuild it from every invoice."""
+        async with self._lock:
+            await db[CUBE_COLLECTION].drop()
+            await db.report_state.delete_one({"_id": STATE_ID})
+            await db.report_state.delete_many({"kind": FOLD_KIND})
+        await ensure_indexes(db)
+        return await self.refresh(db)
+
+    async def top_products(self, db, start: str, end: str, limit: int = 10):
+        if not getattr(db, "supports_aggregation", True):
+            rows = await self._cube_rows(db, {"day": {"$gte": start, "$lte": end}})
+            totals = {}
+            for row in rows:
+                total = totals.get(row["product_id"])
+                if total is None:
+                    total = totals[row["product_id"]] = {
+                        "product_id": row["product_id"], "quantity": 0, "revenue": 0.0, "invoice_count": 0
+                    }
+                total["product_name"] = row["product_name"]
+                total["category"] = row["category"]
+                total["quantity"] += row["quantity"]
+                total["revenue"] += row["revenue"]
+                total["invoice_count"] += row["invoice_count"]
+            return sorted(totals.values(), key=lambda t: t["revenue"], reverse=True)[:limit]
+
+        pipeline = [
+            {"$match": {"day": {"$gte": start, "$lte": end}}},
+            {"$group": {
+                "_id": "$product_id",
+                "product_name": {"$last": "$product_name"},
+                "category": {"$last": "$category"},
+                "quantity": {"$sum": "$quantity"},
+                "revenue": {"$sum": "$revenue"},
+                "invoice_count": {"$sum": "$invoice_count"},
+            }},
+            {"$sort": {"revenue": -1}},
+            {"$limit": limit},
+            {"$project": {
+                "_id": 0,
+                "product_id": "$_id",
+                "product_name": 1,
+                "category": 1,
+                "quantity": 1,
+                "revenue": 1,
+                "invoice_count": 1,
+            }},
+        ]
+        return await db[CUBE_COLLECTION].aggregate(pipeline).to_list(limit)
+
+    async def category_sales(self, db, start: str, end: str, retailer_id: Optional[str] = None):
+        match = {"day": {"$gte": start, "$lte": end}}
+        if retailer_id:
+            match["retailer_id"] = retailer_id
+        if not getattr(db, "supports_aggregation", True):
+            totals = {}
+            for row in await self._cube_rows(db, match):
+                key = (row["category"], row["retailer_id"])
+                total = totals.get(key)
+                if total is None:
+                    total = totals[key] = {
+                        "category": row["category"], "retailer_id": row["retailer_id"], "quantity": 0, "revenue": 0.0
+                    }
+                total["retailer_name"] = row["retailer_name"]
+                total["quantity"] += row["quantity"]
+                total["revenue"] += row["revenue"]
+            return sorted(totals.values(), key=lambda t: t["revenue"], reverse=True)
+
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": {"category": "$category", "retailer_id": "$retailer_id"},
+                "retailer_name": {"$last": "$retailer_name"},
+                "quantity": {"$sum": "$quantity"},
+                "revenue": {"$sum": "$revenue"},
+            }},
+            {"$sort": {"revenue": -1}},
+            {"$project": {
+                "_id": 0,
+                "category": "$_id.category",
+                "retailer_id": "$_id.retailer_id",
+                "retailer_name": 1,
+                "quantity": 1,
+                "revenue": 1,
+            }},
+        ]
+        return await db[CUBE_COLLECTION].aggregate(pipeline).to_list(None)
+
+    async def _cube_rows(self, db, match: dict):
+        return await db[CUBE_COLLECTION].find(match, {"_id": 0}).sort("day", 1).to_list(None)
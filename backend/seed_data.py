@@ -1,83 +1,118 @@
-from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime, timedelta, timezone
-import os
 import uuid
 import asyncio
 from auth import get_password_hash
+from invoice_numbers import COUNTERS_COLLECTION, FIRST_INVOICE_NUMBER, format_invoice_number, set_invoice_counter
+from pricing import bump_catalog_version
+from storage import create_client, get_database
+from reporting import CUBE_COLLECTION, ensure_indexes as ensure_reporting_indexes
+from audit import ensure_indexes as ensure_audit_indexes
+from reminders import REMINDER_LOG_COLLECTION, ensure_indexes as ensure_reminder_indexes
+
+# Dropped and recreated on every seed. Derived collections go too, so reports
+# and reminders never describe invoices that no longer exist.
+SEED_COLLECTIONS = [
+    "admins", "retailers", "products", "invoices", "payments",
+    CUBE_COLLECTION, "report_state", REMINDER_LOG_COLLECTION, COUNTERS_COLLECTION,
+]
+
+SEED_RETAILERS = [
+    {"shop_name": "City Books & Stationery", "owner_name": "Rajesh Kumar", "phone_number": "9876543210", "address": "MG Road, Bangalore"},
+    {"shop_name": "Students Corner", "owner_name": "Priya Sharma", "phone_number": "9876543211", "address": "Jayanagar, Bangalore"},
+    {"shop_name": "Office Supplies Hub", "owner_name": "Amit Patel", "phone_number": "9876543212", "address": "Koramangala, Bangalore"},
+    {"shop_name": "Smart Stationery", "owner_name": "Sneha Reddy", "phone_number": "9876543213", "address": "Whitefield, Bangalore"},
+    {"shop_name": "Book World", "owner_name": "Vikram Singh", "phone_number": "9876543214", "address": "Indiranagar, Bangalore"},
+    {"shop_name": "Paper Plus", "owner_name": "Meera Joshi", "phone_number": "9876543215", "address": "HSR Layout, Bangalore"},
+    {"shop_name": "Write Right Stationery", "owner_name": "Arjun Nair", "phone_number": "9876543216", "address": "Marathahalli, Bangalore"},
+    {"shop_name": "Campus Supplies", "owner_name": "Kavita Desai", "phone_number": "9876543217", "address": "BTM Layout, Bangalore"},
+]
+
+SEED_PRODUCTS = [
+    {"product_name": "A4 Notebook (200 pages)", "category": "Notebooks", "price": 120.0, "stock_quantity": 500, "unit": "pieces"},
+    {"product_name": "Single Line Notebook", "category": "Notebooks", "price": 40.0, "stock_quantity": 800, "unit": "pieces"},
+    {"product_name": "Double Line Notebook", "category": "Notebooks", "price": 45.0, "stock_quantity": 750, "unit": "pieces"},
+    {"product_name": "Graph Notebook", "category": "Notebooks", "price": 50.0, "stock_quantity": 300, "unit": "pieces"},
+    {"product_name": "Spiral Notebook A5", "category": "Notebooks", "price": 80.0, "stock_quantity": 400, "unit": "pieces"},
+    {"product_name": "Blue Ballpoint Pen", "category": "Pens", "price": 5.0, "stock_quantity": 2000, "unit": "pieces"},
+    {"product_name": "Black Ballpoint Pen", "category": "Pens", "price": 5.0, "stock_quantity": 1800, "unit": "pieces"},
+    {"product_name": "Gel Pen Set (5 colors)", "category": "Pens", "price": 50.0, "stock_quantity": 300, "unit": "sets"},
+    {"product_name": "Pencil (HB)", "category": "Pencils", "price": 3.0, "stock_quantity": 3000, "unit": "pieces"},
+    {"product_name": "Pencil Box", "category": "Accessories", "price": 60.0, "stock_quantity": 200, "unit": "pieces"},
+    {"product_name": "Eraser", "category": "Accessories", "price": 5.0, "stock_quantity": 1500, "unit": "pieces"},
+    {"product_name": "Sharpener", "category": "Accessories", "price": 5.0, "stock_quantity": 1200, "unit": "pieces"},
+    {"product_name": "Ruler (30cm)", "category": "Accessories", "price": 15.0, "stock_quantity": 600, "unit": "pieces"},
+    {"product_name": "Geometry Box", "category": "Accessories", "price": 100.0, "stock_quantity": 150, "unit": "pieces"},
+    {"product_name": "A4 Paper Ream (500 sheets)", "category": "Paper", "price": 250.0, "stock_quantity": 400, "unit": "reams"},
+    {"product_name": "Color Paper Pack (50 sheets)", "category": "Paper", "price": 120.0, "stock_quantity": 250, "unit": "packs"},
+    {"product_name": "Chart Paper (10 sheets)", "category": "Paper", "price": 80.0, "stock_quantity": 180, "unit": "packs"},
+    {"product_name": "Glue Stick", "category": "Adhesives", "price": 25.0, "stock_quantity": 500, "unit": "pieces"},
+    {"product_name": "Fevicol (100ml)", "category": "Adhesives", "price": 40.0, "stock_quantity": 300, "unit": "bottles"},
+    {"product_name": "Stapler", "category": "Office Supplies", "price": 120.0, "stock_quantity": 8, "unit": "pieces"},
+    {"product_name": "Stapler Pins (1000 pins)", "category": "Office Supplies", "price": 20.0, "stock_quantity": 400, "unit": "boxes"},
+    {"product_name": "Paper Clips (100 pcs)", "category": "Office Supplies", "price": 30.0, "stock_quantity": 6, "unit": "boxes"},
+    {"product_name": "File Folder", "category": "Office Supplies", "price": 35.0, "stock_quantity": 3, "unit": "pieces"},
+    {"product_name": "Highlighter (Set of 4)", "category": "Markers", "price": 80.0, "stock_quantity": 200, "unit": "sets"},
+    {"product_name": "Permanent Marker", "category": "Markers", "price": 25.0, "stock_quantity": 350, "unit": "pieces"},
+]
+
+ADMIN_EMAIL = "admin@stationery.com"
+ADMIN_PASSWORD = "Admin@123"
+
+
+async def reset_database(db):
+    """Drop the seeded collections; much faster than delete_many on large data."""
+    for name in SEED_COLLECTIONS:
+        await db.drop_collection(name)
+
+
+async def create_indexes(db):
+    await db.retailers.create_index("id")
+    await db.invoices.create_index("id")
+    await db.invoices.create_index("invoice_number")
+    await db.invoices.create_index("retailer_id")
+    await db.payments.create_index("invoice_id")
+    await ensure_reporting_indexes(db)
+    await ensure_audit_indexes(db)
+    await ensure_reminder_indexes(db)
+
+
+async def create_admin(db):
+    await db.admins.insert_one({
+        "email": ADMIN_EMAIL,
+        "password_hash": get_password_hash(ADMIN_PASSWORD),
+        "name": "S K NoteBook",
+        "created_at": datetime.now(timezone.utc).isoformat()
+    })
+    print(f"Created admin: {ADMIN_EMAIL} / {ADMIN_PASSWORD}")
+
 
 async def seed_database():
-    mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-    db_name = os.environ.get('DB_NAME', 'test_database')
-    
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[db_name]
-    
-    # Clear existing data
-    await db.admins.delete_many({})
-    await db.retailers.delete_many({})
-    await db.products.delete_many({})
-    await db.invoices.delete_many({})
-    await db.payments.delete_many({})
+    client = create_client()
+    db = get_database(client)
     
+    await reset_database(db)
     print("Cleared existing data")
     
-    # Create admin
-    admin_data = {
-        "email": "admin@stationery.com",
-        "password_hash": get_password_hash("Admin@123"),
-        "name": "S K NoteBook",
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    await db.admins.insert_one(admin_data)
-    print("Created admin: admin@stationery.com / Admin@123")
+    await create_admin(db)
     
-    # Create retailers
+    now = datetime.now(timezone.utc).isoformat()
     retailers = [
-        {"id": str(uuid.uuid4()), "shop_name": "City Books & Stationery", "owner_name": "Rajesh Kumar", "phone_number": "9876543210", "address": "MG Road, Bangalore", "total_due": 0.0, "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "shop_name": "Students Corner", "owner_name": "Priya Sharma", "phone_number": "9876543211", "address": "Jayanagar, Bangalore", "total_due": 0.0, "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "shop_name": "Office Supplies Hub", "owner_name": "Amit Patel", "phone_number": "9876543212", "address": "Koramangala, Bangalore", "total_due": 0.0, "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "shop_name": "Smart Stationery", "owner_name": "Sneha Reddy", "phone_number": "9876543213", "address": "Whitefield, Bangalore", "total_due": 0.0, "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "shop_name": "Book World", "owner_name": "Vikram Singh", "phone_number": "9876543214", "address": "Indiranagar, Bangalore", "total_due": 0.0, "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "shop_name": "Paper Plus", "owner_name": "Meera Joshi", "phone_number": "9876543215", "address": "HSR Layout, Bangalore", "total_due": 0.0, "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "shop_name": "Write Right Stationery", "owner_name": "Arjun Nair", "phone_number": "9876543216", "address": "Marathahalli, Bangalore", "total_due": 0.0, "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "shop_name": "Campus Supplies", "owner_name": "Kavita Desai", "phone_number": "9876543217", "address": "BTM Layout, Bangalore", "total_due": 0.0, "created_at": datetime.now(timezone.utc).isoformat()},
+        {"id": str(uuid.uuid4()), **retailer, "total_due": 0.0, "created_at": now}
+        for retailer in SEED_RETAILERS
     ]
-    await db.retailers.insert_many(retailers)
-    print(f"Created {len(retailers)} retailers")
-    
-    # Create products
     products = [
-        {"id": str(uuid.uuid4()), "product_name": "A4 Notebook (200 pages)", "category": "Notebooks", "price": 120.0, "stock_quantity": 500, "unit": "pieces", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Single Line Notebook", "category": "Notebooks", "price": 40.0, "stock_quantity": 800, "unit": "pieces", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Double Line Notebook", "category": "Notebooks", "price": 45.0, "stock_quantity": 750, "unit": "pieces", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Graph Notebook", "category": "Notebooks", "price": 50.0, "stock_quantity": 300, "unit": "pieces", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Spiral Notebook A5", "category": "Notebooks", "price": 80.0, "stock_quantity": 400, "unit": "pieces", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Blue Ballpoint Pen", "category": "Pens", "price": 5.0, "stock_quantity": 2000, "unit": "pieces", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Black Ballpoint Pen", "category": "Pens", "price": 5.0, "stock_quantity": 1800, "unit": "pieces", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Gel Pen Set (5 colors)", "category": "Pens", "price": 50.0, "stock_quantity": 300, "unit": "sets", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Pencil (HB)", "category": "Pencils", "price": 3.0, "stock_quantity": 3000, "unit": "pieces", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Pencil Box", "category": "Accessories", "price": 60.0, "stock_quantity": 200, "unit": "pieces", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Eraser", "category": "Accessories", "price": 5.0, "stock_quantity": 1500, "unit": "pieces", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Sharpener", "category": "Accessories", "price": 5.0, "stock_quantity": 1200, "unit": "pieces", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Ruler (30cm)", "category": "Accessories", "price": 15.0, "stock_quantity": 600, "unit": "pieces", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Geometry Box", "category": "Accessories", "price": 100.0, "stock_quantity": 150, "unit": "pieces", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "A4 Paper Ream (500 sheets)", "category": "Paper", "price": 250.0, "stock_quantity": 400, "unit": "reams", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Color Paper Pack (50 sheets)", "category": "Paper", "price": 120.0, "stock_quantity": 250, "unit": "packs", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Chart Paper (10 sheets)", "category": "Paper", "price": 80.0, "stock_quantity": 180, "unit": "packs", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Glue Stick", "category": "Adhesives", "price": 25.0, "stock_quantity": 500, "unit": "pieces", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Fevicol (100ml)", "category": "Adhesives", "price": 40.0, "stock_quantity": 300, "unit": "bottles", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Stapler", "category": "Office Supplies", "price": 120.0, "stock_quantity": 8, "unit": "pieces", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Stapler Pins (1000 pins)", "category": "Office Supplies", "price": 20.0, "stock_quantity": 400, "unit": "boxes", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Paper Clips (100 pcs)", "category": "Office Supplies", "price": 30.0, "stock_quantity": 6, "unit": "boxes", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "File Folder", "category": "Office Supplies", "price": 35.0, "stock_quantity": 3, "unit": "pieces", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Highlighter (Set of 4)", "category": "Markers", "price": 80.0, "stock_quantity": 200, "unit": "sets", "created_at": datetime.now(timezone.utc).isoformat()},
-        {"id": str(uuid.uuid4()), "product_name": "Permanent Marker", "category": "Markers", "price": 25.0, "stock_quantity": 350, "unit": "pieces", "created_at": datetime.now(timezone.utc).isoformat()},
+        {"id": str(uuid.uuid4()), **product, "created_at": now}
+        for product in SEED_PRODUCTS
     ]
     await db.products.insert_many(products)
+    await bump_catalog_version(db)
     print(f"Created {len(products)} products")
     
     # Create invoices
-    invoice_counter = 1001
+    invoices = []
+    payments = []
+    total_due = {}
+    invoice_counter = FIRST_INVOICE_NUMBER
     for i in range(15):
         retailer = retailers[i % len(retailers)]
         days_ago = 30 - (i * 2)
@@ -117,7 +152,7 @@ async def seed_database():
         
         invoice = {
             "id": str(uuid.uuid4()),
-            "invoice_number": f"INV-{invoice_counter}",
+            "invoice_number": format_invoice_number(invoice_counter),
             "retailer_id": retailer["id"],
             "retailer_name": retailer["shop_name"],
             "products": invoice_products,
@@ -129,14 +164,11 @@ async def seed_database():
             "created_at": invoice_date.isoformat()
         }
         
-        await db.invoices.insert_one(invoice)
+        invoices.append(invoice)
         invoice_counter += 1
         
-        # Update retailer total due
-        await db.retailers.update_one(
-            {"id": retailer["id"]},
-            {"$inc": {"total_due": due_amount}}
-        )
+        # Retailer total due
+        total_due[retailer["id"]] = total_due.get(retailer["id"], 0.0) + due_amount
         
         # Create payment record if paid
         if paid_amount > 0:
@@ -149,15 +181,25 @@ async def seed_database():
                 "payment_date": invoice_date.isoformat(),
                 "notes": "Initial payment"
             }
-            await db.payments.insert_one(payment)
+            payments.append(payment)
+    
+    for retailer in retailers:
+        retailer["total_due"] = round(total_due.get(retailer["id"], 0.0), 2)
+    await db.retailers.insert_many(retailers)
+    print(f"Created {len(retailers)} retailers")
+    
+    await db.invoices.insert_many(invoices)
+    await db.payments.insert_many(payments)
+    await set_invoice_counter(db, invoice_counter - 1)
+    print(f"Created {len(invoices)} invoices with payments")
     
-    print(f"Created 15 invoices with payments")
+    await create_indexes(db)
     
     client.close()
     print("\n=== Seed Data Complete ===")
-    print("Admin Login: admin@stationery.com / Admin@123")
+    print(f"Admin Login: {ADMIN_EMAIL} / {ADMIN_PASSWORD}")
 
 if __name__ == "__main__":
     from dotenv import load_dotenv
     load_dotenv()
-    asyncio.run(seed_database())
\ No newline at end of file
+    asyncio.run(seed_database())
@@ -1,33 +1,72 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status
+import time
+_process_import_started = time.perf_counter()
+
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
 import uuid
-from typing import List
+import json
+from typing import List, Optional
+from urllib.parse import urlsplit
 
 from models import (
     Admin, AdminLogin, TokenResponse,
     Retailer, RetailerCreate, RetailerUpdate,
     Product, ProductCreate, ProductUpdate,
-    Invoice, InvoiceCreate, InvoiceStatus,
+    Invoice, InvoiceCreate, InvoiceStatus, QuoteRequest, Quote,
     Payment, PaymentCreate,
-    DashboardStats
+    DashboardStats, ProductSales, CategorySales, AuditEvent,
+    ProfilerSettingsUpdate, ProfilerStatus, ProfileSummary,
+    BatchOperation, BatchRequest, BatchResult, BatchResponse,
+    encode_line_items
 )
+from invoice_numbers import next_invoice_number
+from pricing import PricingEngine, UnknownProductError, warm_up as warm_up_pricing
+from audit import AuditLog, ensure_indexes as ensure_audit_indexes
+from admission import AdmissionController, AdmissionRejected
+from profiling import Profiler
+from storage import create_client, get_database
+from reporting import SalesCube, ensure_indexes as ensure_reporting_indexes
+from reminders import ReminderDispatcher, ensure_indexes as ensure_reminder_indexes
 from auth import (
-    verify_password, get_password_hash, create_access_token, verify_token
+    verify_password, get_password_hash, create_access_token, verify_token,
+    token_subject, warm_up
 )
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# On-demand request profiler (off unless PROFILER_ENABLED or toggled via API)
+profiler = Profiler()
+
+# Database connection (MongoDB, or embedded SQLite with STORAGE_BACKEND=sqlite)
+client = create_client(mongo_event_listeners=profiler.command_listeners)
+db = get_database(client)
+
+# Store new invoices' line items as compact parallel arrays (opt-in)
+COMPACT_LINE_ITEMS = os.environ.get('INVOICE_LINE_ENCODING', 'full').lower() == 'compact'
+
+# Catalog prices, tier discounts and taxes for server-side invoice pricing
+pricing_engine = PricingEngine()
+
+# Materialized per-product/retailer/day sales for reports, refreshed in the
+# background (REPORT_REFRESH_INTERVAL)
+sales_cube = SalesCube()
+
+# Write-behind audit trail of every mutation
+audit_log = AuditLog()
+
+# Priority classes, per-route limits and per-token rate limits
+admission = AdmissionController()
+
+# Scheduled payment reminders for overdue retailers (REMINDERS_ENABLED)
+reminders = ReminderDispatcher()
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -35,6 +74,12 @@ app = FastAPI()
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# =============== HEALTH ROUTES ===============
+
+@api_router.get("/health")
+async def health():
+    return {"status": "ok"}
+
 # =============== AUTH ROUTES ===============
 
 @api_router.post("/auth/login", response_model=TokenResponse)
@@ -93,6 +138,7 @@ async def create_retailer(retailer: RetailerCreate, email: str = Depends(verify_
     }
     
     await db.retailers.insert_one(retailer_data)
+    await audit_log.record(email, "create", "retailer", retailer_id, retailer.model_dump())
     
     return Retailer(**{
         **retailer_data,
@@ -118,6 +164,8 @@ async def update_retailer(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Retailer not found")
     
+    await audit_log.record(email, "update", "retailer", retailer_id, update_data)
+    
     retailer_doc = await db.retailers.find_one({"id": retailer_id}, {"_id": 0})
     
     if isinstance(retailer_doc["created_at"], str):
@@ -127,11 +175,13 @@ async def update_retailer(
 
 @api_router.delete("/retailers/{retailer_id}")
 async def delete_retailer(retailer_id: str, email: str = Depends(verify_token)):
-    result = await db.retailers.delete_one({"id": retailer_id})
+    deleted = await db.retailers.find_one_and_delete({"id": retailer_id}, {"_id": 0})
     
-    if result.deleted_count == 0:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Retailer not found")
     
+    await audit_log.record(email, "delete", "retailer", retailer_id, deleted)
+    
     return {"message": "Retailer deleted successfully"}
 
 # =============== PRODUCT ROUTES ===============
@@ -156,6 +206,8 @@ async def create_product(product: ProductCreate, email: str = Depends(verify_tok
     }
     
     await db.products.insert_one(product_data)
+    await pricing_engine.catalog_changed(db)
+    await audit_log.record(email, "create", "product", product_id, product.model_dump())
     
     return Product(**{
         **product_data,
@@ -181,6 +233,9 @@ async def update_product(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    await pricing_engine.catalog_changed(db)
+    await audit_log.record(email, "update", "product", product_id, update_data)
+    
     product_doc = await db.products.find_one({"id": product_id}, {"_id": 0})
     
     if isinstance(product_doc["created_at"], str):
@@ -190,11 +245,14 @@ async def update_product(
 
 @api_router.delete("/products/{product_id}")
 async def delete_product(product_id: str, email: str = Depends(verify_token)):
-    result = await db.products.delete_one({"id": product_id})
+    deleted = await db.products.find_one_and_delete({"id": product_id}, {"_id": 0})
     
-    if result.deleted_count == 0:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    await pricing_engine.catalog_changed(db)
+    await audit_log.record(email, "delete", "product", product_id, deleted)
+    
     return {"message": "Product deleted successfully"}
 
 # =============== INVOICE ROUTES ===============
@@ -225,6 +283,20 @@ async def get_invoice(invoice_id: str, email: str = Depends(verify_token)):
     
     return Invoice(**invoice_doc)
 
+async def _price_order(lines) -> Quote:
+    if not lines:
+        raise HTTPException(status_code=400, detail="Invoice must contain at least one product")
+    if any(line.quantity <= 0 for line in lines):
+        raise HTTPException(status_code=400, detail="Quantity must be greater than zero")
+    try:
+        return await pricing_engine.quote(db, lines)
+    except UnknownProductError as exc:
+        raise HTTPException(status_code=404, detail=f"Product not found: {exc.product_id}")
+
+@api_router.post("/invoices/quote", response_model=Quote)
+async def quote_invoice(quote_request: QuoteRequest, email: str = Depends(verify_token)):
+    return await _price_order(quote_request.products)
+
 @api_router.post("/invoices", response_model=Invoice)
 async def create_invoice(invoice_data: InvoiceCreate, email: str = Depends(verify_token)):
     # Get retailer
@@ -232,9 +304,14 @@ async def create_invoice(invoice_data: InvoiceCreate, email: str = Depends(verif
     if not retailer:
         raise HTTPException(status_code=404, detail="Retailer not found")
     
-    # Calculate total amount
-    total_amount = sum(p.total for p in invoice_data.products)
-    due_amount = total_amount - invoice_data.paid_amount
+    # Price line items from the catalog
+    quote = await _price_order(invoice_data.products)
+    total_amount = quote.total_amount
+    if invoice_data.paid_amount < 0:
+        raise HTTPException(status_code=400, detail="Paid amount cannot be negative")
+    if invoice_data.paid_amount > total_amount:
+        raise HTTPException(status_code=400, detail="Paid amount exceeds invoice total")
+    due_amount = round(total_amount - invoice_data.paid_amount, 2)
     
     # Determine status
     if due_amount == 0:
@@ -244,13 +321,7 @@ async def create_invoice(invoice_data: InvoiceCreate, email: str = Depends(verif
     else:
         status = InvoiceStatus.UNPAID
     
-    # Generate invoice number
-    last_invoice = await db.invoices.find_one({}, {"_id": 0}, sort=[("invoice_number", -1)])
-    if last_invoice:
-        last_number = int(last_invoice["invoice_number"].split("-")[1])
-        invoice_number = f"INV-{last_number + 1}"
-    else:
-        invoice_number = "INV-1001"
+    invoice_number = await next_invoice_number(db)
     
     # Create invoice
     invoice_id = str(uuid.uuid4())
@@ -260,7 +331,7 @@ async def create_invoice(invoice_data: InvoiceCreate, email: str = Depends(verif
         "invoice_number": invoice_number,
         "retailer_id": invoice_data.retailer_id,
         "retailer_name": retailer["shop_name"],
-        "products": [p.model_dump() for p in invoice_data.products],
+        "products": [p.model_dump() for p in quote.products],
         "total_amount": total_amount,
         "paid_amount": invoice_data.paid_amount,
         "due_amount": due_amount,
@@ -269,6 +340,8 @@ async def create_invoice(invoice_data: InvoiceCreate, email: str = Depends(verif
         "notes": invoice_data.notes,
         "created_at": now.isoformat()
     }
+    if COMPACT_LINE_ITEMS:
+        invoice["lines"] = encode_line_items(invoice.pop("products"))
     
     await db.invoices.insert_one(invoice)
     
@@ -298,6 +371,13 @@ async def create_invoice(invoice_data: InvoiceCreate, email: str = Depends(verif
         }
         await db.payments.insert_one(payment)
     
+    await audit_log.record(email, "create", "invoice", invoice_id, {
+        "invoice_number": invoice_number,
+        "retailer_id": invoice_data.retailer_id,
+        "total_amount": total_amount,
+        "paid_amount": invoice_data.paid_amount
+    })
+    
     return Invoice(**{
         **invoice,
         "created_at": now,
@@ -370,6 +450,14 @@ async def create_payment(payment_data: PaymentCreate, email: str = Depends(verif
         {"$inc": {"total_due": -payment_data.amount}}
     )
     
+    await audit_log.record(email, "create", "payment", payment_id, {
+        "invoice_id": payment_data.invoice_id,
+        "invoice_number": invoice["invoice_number"],
+        "amount": payment_data.amount,
+        "due_amount": new_due_amount,
+        "status": new_status
+    })
+    
     return Payment(**{
         **payment,
         "payment_date": now
@@ -433,9 +521,286 @@ async def get_dashboard_stats(email: str = Depends(verify_token)):
         recent_invoices=[Invoice(**i) for i in recent_invoices]
     )
 
+# =============== REPORT ROUTES ===============
+
+def _report_range(start: Optional[str], end: Optional[str]):
+    today = datetime.now(timezone.utc).date()
+    try:
+        start_day = date.fromisoformat(start) if start else today.replace(day=1)
+        end_day = date.fromisoformat(end) if end else today
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    return start_day.isoformat(), end_day.isoformat()
+
+async def _flag_stale_report(response: Response):
+    # Set while the cube is missing invoices and waiting to be rebuilt
+    if (await sales_cube.status(db))["stale"]:
+        response.headers["X-Report-Stale"] = "true"
+
+@api_router.get("/reports/top-products", response_model=List[ProductSales])
+async def get_top_products(
+    response: Response,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: int = 10,
+    email: str = Depends(verify_token)
+):
+    start_day, end_day = _report_range(start, end)
+    await _flag_stale_report(response)
+    return await sales_cube.top_products(db, start_day, end_day, min(max(limit, 1), 100))
+
+@api_router.get("/reports/category-sales", response_model=List[CategorySales])
+async def get_category_sales(
+    response: Response,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    retailer_id: Optional[str] = None,
+    email: str = Depends(verify_token)
+):
+    start_day, end_day = _report_range(start, end)
+    await _flag_stale_report(response)
+    return await sales_cube.category_sales(db, start_day, end_day, retailer_id)
+
+@api_router.post("/reports/refresh")
+async def refresh_reports(rebuild: bool = False, email: str = Depends(verify_token)):
+    if rebuild:
+        processed = await sales_cube.rebuild(db)
+    else:
+        processed = await sales_cube.repair(db)
+        if processed is None:
+            processed = await sales_cube.refresh(db)
+    return {"invoices_processed": processed}
+
+@api_router.get("/admin/reports")
+async def get_report_status(email: str = Depends(verify_token)):
+    return await sales_cube.status(db)
+
+# =============== PROFILER ROUTES ===============
+
+def _profiler_status() -> ProfilerStatus:
+    return ProfilerStatus(
+        **profiler.settings(),
+        profiled_requests=profiler.profiled_requests,
+        stored_profiles=len(profiler.profiles())
+    )
+
+@api_router.get("/admin/profiler", response_model=ProfilerStatus)
+async def get_profiler(email: str = Depends(verify_token)):
+    return _profiler_status()
+
+@api_router.put("/admin/profiler", response_model=ProfilerStatus)
+async def update_profiler(settings_update: ProfilerSettingsUpdate, email: str = Depends(verify_token)):
+    # Only the fields sent are changed; the rest keep their current values
+    update_data = {k: v for k, v in settings_update.model_dump().items() if v is not None}
+    profiler.configure(**{**profiler.settings(), **update_data})
+    logger.info("Profiler settings changed by %s: %s", email, update_data)
+    return _profiler_status()
+
+@api_router.get("/admin/profiler/profiles", response_model=List[ProfileSummary])
+async def get_profiles(email: str = Depends(verify_token)):
+    return [p.summary() for p in profiler.profiles()]
+
+@api_router.delete("/admin/profiler/profiles")
+async def clear_profiles(email: str = Depends(verify_token)):
+    profiler.clear()
+    return {"message": "Profiles cleared"}
+
+@api_router.get("/admin/profiler/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = "json", email: str = Depends(verify_token)):
+    profile = profiler.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    if format == "collapsed":
+        return PlainTextResponse(profile.collapsed())
+    if format == "speedscope":
+        return profile.speedscope(profiler.interval_ms)
+    if format == "json":
+        return profile.to_dict()
+    raise HTTPException(status_code=400, detail="format must be one of: json, collapsed, speedscope")
+
+# =============== AUDIT ROUTES ===============
+
+@api_router.get("/audit", response_model=List[AuditEvent])
+async def get_audit_events(
+    entity: Optional[str] = None,
+    entity_id: Optional[str] = None,
+    limit: int = 100,
+    email: str = Depends(verify_token)
+):
+    query = {}
+    if entity:
+        query["entity"] = entity
+    if entity_id:
+        query["entity_id"] = entity_id
+    
+    limit = min(max(limit, 1), 1000)
+    events = await db.audit_log.find(query, {"_id": 0}).sort("timestamp", -1).limit(limit).to_list(limit)
+    
+    for event in events:
+        if isinstance(event.get("timestamp"), str):
+            event["timestamp"] = datetime.fromisoformat(event["timestamp"])
+    
+    return events
+
+@api_router.get("/admin/audit")
+async def get_audit_stats(email: str = Depends(verify_token)):
+    return audit_log.stats()
+
+# =============== ADMISSION ROUTES ===============
+
+@api_router.get("/admin/admission")
+async def get_admission_stats(email: str = Depends(verify_token)):
+    return admission.stats()
+
+# =============== REMINDER ROUTES ===============
+
+@api_router.post("/reminders/run")
+async def run_reminders(dry_run: bool = False, email: str = Depends(verify_token)):
+    try:
+        return await reminders.run(db, dry_run=dry_run)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+@api_router.get("/admin/reminders")
+async def get_reminder_status(email: str = Depends(verify_token)):
+    return reminders.status()
+
+# =============== BATCH ROUTES ===============
+
+MAX_BATCH_OPERATIONS = int(os.environ.get('MAX_BATCH_OPERATIONS', '20'))
+
+def _response_body(raw: bytes, headers: dict):
+    if not raw:
+        return None
+    if headers.get(b"content-type", b"").startswith(b"application/json"):
+        return json.loads(raw)
+    return raw.decode()
+
+async def _run_operation(operation: BatchOperation, request: Request) -> BatchResult:
+    """Run one operation through the app in-process, as if it were its own request.
+
+    It goes through the same middleware (admission, profiling), routing,
+    authentication, validation and error handling as a standalone request.
+    """
+    url = urlsplit(operation.path)
+    if url.path.rstrip("/") == "/batch":
+        return BatchResult(status=400, body={"detail": "Nested batch requests are not allowed"})
+
+    path = api_router.prefix + url.path
+    payload = b"" if operation.body is None else json.dumps(operation.body).encode()
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())]
+    if request.headers.get("authorization"):
+        headers.append((b"authorization", request.headers["authorization"].encode()))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": operation.method.upper(),
+        "scheme": request.url.scheme,
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": url.query.encode(),
+        "headers": headers,
+        "client": request.client,
+        "server": request.scope.get("server"),
+    }
+
+    body_sent = False
+    response_complete = asyncio.Event()
+    response = {"status": 500, "headers": {}, "body": b""}
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        # Only report a disconnect once the response is done, or streaming
+        # responses would be cancelled
+        await response_complete.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = dict(message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+            if not message.get("more_body", False):
+                response_complete.set()
+
+    try:
+        await app(scope, receive, send)
+        body = _response_body(response["body"], response["headers"])
+    except Exception:
+        # One failing operation must not take down the rest of the batch
+        logger.exception("Batch operation %s %s failed", operation.method, operation.path)
+        return BatchResult(status=500, body={"detail": "Internal Server Error"})
+    finally:
+        response_complete.set()
+
+    retry_after = response["headers"].get(b"retry-after")
+    if response["status"] == 429 and retry_after and isinstance(body, dict):
+        body["retry_after"] = int(retry_after)
+    return BatchResult(status=response["status"], body=body)
+
+@api_router.post("/batch", response_model=BatchResponse)
+async def batch(batch_request: BatchRequest, request: Request, email: str = Depends(verify_token)):
+    operations = batch_request.operations
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch may contain at most {MAX_BATCH_OPERATIONS} operations"
+        )
+
+    # Consecutive reads run concurrently; writes run one at a time in the
+    # order given so a later read sees the effect of an earlier write.
+    results = []
+    pending_reads = []
+    for operation in operations:
+        if operation.method.upper() == "GET":
+            pending_reads.append(operation)
+            continue
+        if pending_reads:
+            results.extend(await asyncio.gather(*(_run_operation(op, request) for op in pending_reads)))
+            pending_reads = []
+        results.append(await _run_operation(operation, request))
+    if pending_reads:
+        results.extend(await asyncio.gather(*(_run_operation(op, request) for op in pending_reads)))
+
+    return BatchResponse(results=results)
+
 # Include the router in the main app
 app.include_router(api_router)
 
+def _client_identity(request: Request) -> str:
+    # Only a verified token earns its own bucket; anything else shares the
+    # bucket of the address it came from
+    subject = token_subject(request.headers.get("authorization"))
+    if subject:
+        return f"user:{subject}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+# Registered before CORS so that 429 responses still carry CORS headers
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    try:
+        ticket = admission.admit(request.method, request.url.path, _client_identity(request))
+    except AdmissionRejected as exc:
+        return JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content={"detail": exc.detail},
+            headers={"Retry-After": str(exc.retry_after)}
+        )
+    
+    if ticket is None:
+        return await call_next(request)
+    try:
+        return await call_next(request)
+    finally:
+        admission.release(ticket)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -444,6 +809,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    if not profiler.should_profile():
+        return await call_next(request)
+    
+    profile, token = profiler.start(request.method, request.url.path)
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        profiler.finish(profile, token, status_code)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -451,6 +830,35 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_tasks():
+    logger.info(
+        "Worker ready in %.0f ms",
+        (time.perf_counter() - _process_import_started) * 1000
+    )
+    # passlib/jose/numpy are imported lazily; load them off the event loop
+    # once the worker is already accepting requests.
+    loop = asyncio.get_running_loop()
+    loop.run_in_executor(None, warm_up)
+    loop.run_in_executor(None, warm_up_pricing)
+    audit_log.start(db)
+    reminders.start(db)
+    sales_cube.start(db)
+    # Index creation needs a database round trip; don't hold up startup on it
+    asyncio.create_task(ensure_indexes())
+
+async def ensure_indexes():
+    try:
+        await ensure_reporting_indexes(db)
+        await ensure_audit_indexes(db)
+        await ensure_reminder_indexes(db)
+    except Exception:
+        logger.exception("Failed to create indexes")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    # Write out queued audit events before the connection goes away
+    await audit_log.close()
+    await reminders.close()
+    await sales_cube.close()
     client.close()
@@ -1,12 +1,14 @@
 """
 Database Setup Script
 This script will wait for MongoDB to be available and then seed the database.
+With STORAGE_BACKEND=sqlite there is no server to wait for.
 """
 import asyncio
 import time
 from motor.motor_asyncio import AsyncIOMotorClient
 from seed_data import seed_database
 from dotenv import load_dotenv
+from storage import storage_backend
 import os
 
 async def wait_for_mongodb(max_attempts=30, delay=2):
@@ -42,9 +44,11 @@ async def main():
     load_dotenv()
     
     # Wait for MongoDB
-    client = await wait_for_mongodb()
-    if not client:
-        return
+    client = None
+    if storage_backend() == "mongo":
+        client = await wait_for_mongodb()
+        if not client:
+            return
     
     try:
         # Seed the database
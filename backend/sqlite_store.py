@@ -0,0 +1,473 @@
+"""
+SQLite Storage Backend
+An embedded, single-file store that implements the subset of the Motor API
+used by this app (find/find_one/insert/update/bulk_write/delete/count/
+create_index/find_one_and_update), so a branch shop can run without a MongoDB server.
+
+Each collection is a table holding one JSON document per row. Indexes are
+expression indexes on json_extract(), which SQLite uses for the same filters
+and sorts the Mongo queries use. All SQL runs on one dedicated thread, which
+keeps the event loop free and serializes writes the way SQLite wants.
+"""
+import asyncio
+import json
+import re
+import sqlite3
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Optional
+
+# Rows fetched per round trip when a cursor is iterated with `async for`
+STREAM_BATCH_SIZE = 500
+
+_COMPARISON_OPERATORS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<=", "$ne": "!="}
+_FIELD_PATTERN = re.compile(r"^[A-Za-z0-9_.]+$")
+
+
+def _field_expr(field: str) -> str:
+    if not _FIELD_PATTERN.match(field):
+        raise ValueError(f"Unsupported field name: {field!r}")
+    return f"json_extract(doc, '$.{field}')"
+
+
+def _sql_value(value):
+    if isinstance(value, (dict, list)):
+        # Match the compact form json_extract() returns for objects/arrays
+        return json.dumps(value, separators=(",", ":"))
+    return value
+
+
+def _where(filter: Optional[dict]):
+    """Translate a Mongo filter into a SQL WHERE clause and parameters."""
+    clauses = []
+    params = []
+    for field, condition in (filter or {}).items():
+        expr = _field_expr(field)
+        if isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+            for op, value in condition.items():
+                if op in _COMPARISON_OPERATORS:
+                    if op == "$ne" and value is None:
+                        clauses.append(f"{expr} IS NOT NULL")
+                    else:
+                        clauses.append(f"{expr} {_COMPARISON_OPERATORS[op]} ?")
+                        params.append(_sql_value(value))
+                elif op in ("$in", "$nin"):
+                    values = list(value)
+                    if not values:
+                        clauses.append("0" if op == "$in" else "1")
+                        continue
+                    placeholders = ", ".join("?" for _ in values)
+                    negate = "NOT " if op == "$nin" else ""
+                    clauses.append(f"{expr} {negate}IN ({placeholders})")
+                    params.extend(_sql_value(v) for v in values)
+                elif op == "$exists":
+                    clauses.append(f"{expr} IS {'NOT ' if value else ''}NULL")
+                else:
+                    raise NotImplementedError(f"Filter operator {op} is not supported by the SQLite backend")
+        elif condition is None:
+            clauses.append(f"{expr} IS NULL")
+        else:
+            clauses.append(f"{expr} = ?")
+            params.append(_sql_value(condition))
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _order_by(sort) -> str:
+    if not sort:
+        return ""
+    return " ORDER BY " + ", ".join(
+        f"{_field_expr(field)} {'DESC' if direction < 0 else 'ASC'}" for field, direction in sort
+    )
+
+
+def _project(doc: dict, projection: Optional[dict]) -> dict:
+    if not projection:
+        return doc
+    included = [k for k, v in projection.items() if v and k != "_id"]
+    if included:
+        result = {k: doc[k] for k in included if k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+    return {k: v for k, v in doc.items() if projection.get(k, 1)}
+
+
+def _apply_update(doc: dict, update: dict) -> dict:
+    for op, fields in update.items():
+        if op == "$set":
+            doc.update(fields)
+        elif op == "$inc":
+            for field, amount in fields.items():
+                doc[field] = doc.get(field, 0) + amount
+        elif op == "$unset":
+            for field in fields:
+                doc.pop(field, None)
+        else:
+            raise NotImplementedError(f"Update operator {op} is not supported by the SQLite backend")
+    return doc
+
+
+def _normalize_keys(keys):
+    if isinstance(keys, str):
+        return [(keys, 1)]
+    return list(keys)
+
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class InsertManyResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+
+
+class UpdateResult:
+    def __init__(self, matched_count: int, modified_count: int, upserted_id=None):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_id = upserted_id
+
+
+class BulkWriteResult:
+    def __init__(self, matched_count: int, modified_count: int, upserted_count: int):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_count = upserted_count
+
+
+class DeleteResult:
+    def __init__(self, deleted_count: int):
+        self.deleted_count = deleted_count
+
+
+class SQLiteCursor:
+    def __init__(self, collection: "SQLiteCollection", filter, projection):
+        self._collection = collection
+        self._filter = filter
+        self._projection = projection
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key, direction: int = 1):
+        if isinstance(key, str):
+            self._sort.append((key, direction))
+        else:
+            self._sort.extend(key)
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    async def to_list(self, length: Optional[int] = None):
+        limit = self._limit
+        if length:
+            limit = min(limit, length) if limit else length
+        return await self._collection._run(
+            self._collection._select, self._filter, self._projection, self._sort, self._skip, limit
+        )
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        # Streams in batches instead of loading the whole result set
+        collection = self._collection
+        run = collection.database._run
+        reader, rows = await collection._run(
+            collection._open_stream, self._filter, self._sort, self._skip, self._limit
+        )
+        try:
+            while True:
+                batch = await run(rows.fetchmany, STREAM_BATCH_SIZE)
+                if not batch:
+                    break
+                for (doc,) in batch:
+                    yield _project(json.loads(doc), self._projection)
+        finally:
+            await run(reader.close)
+
+
+class SQLiteCollection:
+    def __init__(self, database: "SQLiteDatabase", name: str):
+        if not re.match(r"^[A-Za-z_][A-Za-z0-9_]*$", name):
+            raise ValueError(f"Invalid collection name: {name!r}")
+        self.database = database
+        self.name = name
+        self._table = f'"{name}"'
+        self._created = False
+
+    async def _run(self, fn, *args):
+        return await self.database._run(self._ensure_table_then, fn, *args)
+
+    def _ensure_table_then(self, fn, *args):
+        if not self._created:
+            conn = self.database._conn
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self._table} (rowid INTEGER PRIMARY KEY, doc TEXT NOT NULL)")
+            # Nearly every lookup in the app is by the "id" field; _id is the
+            # primary key, as in MongoDB (report_state, sales_cube, audit_log)
+            conn.execute(
+                f'CREATE INDEX IF NOT EXISTS "ix_{self.name}_id_1" ON {self._table} ({_field_expr("id")})'
+            )
+            conn.execute(
+                f'CREATE UNIQUE INDEX IF NOT EXISTS "ix_{self.name}__id_1" ON {self._table} ({_field_expr("_id")})'
+            )
+            self._created = True
+        return fn(*args)
+
+    # ---- statements (run on the database thread) ----
+
+    def _select_sql(self, columns, filter, sort, skip, limit):
+        where, params = _where(filter)
+        sql = f"SELECT {columns} FROM {self._table}{where}{_order_by(sort)}"
+        if limit or skip:
+            sql += " LIMIT ? OFFSET ?"
+            params = params + [limit or -1, skip]
+        return sql, params
+
+    def _select(self, filter, projection, sort=None, skip=0, limit=0, with_rowid=False):
+        sql, params = self._select_sql("rowid, doc", filter, sort, skip, limit)
+        rows = self.database._conn.execute(sql, params).fetchall()
+        docs = [_project(json.loads(doc), projection) for _, doc in rows]
+        if with_rowid:
+            return [(rowid, doc) for (rowid, _), doc in zip(rows, docs)]
+        return docs
+
+    def _insert_rows(self, docs):
+        ids = []
+        rows = []
+        for doc in docs:
+            doc = dict(doc)
+            doc.setdefault("_id", uuid.uuid4().hex)
+            ids.append(doc["_id"])
+            rows.append((json.dumps(doc),))
+        self.database._conn.executemany(f"INSERT INTO {self._table} (doc) VALUES (?)", rows)
+        return ids
+
+    def _insert(self, docs):
+        with self.database._transaction():
+            return self._insert_rows(docs)
+
+    def _update_rows(self, filter, update, upsert, many):
+        matches = self._select(filter, None, limit=0 if many else 1, with_rowid=True)
+        self.database._conn.executemany(
+            f"UPDATE {self._table} SET doc = ? WHERE rowid = ?",
+            [(json.dumps(_apply_update(doc, update)), rowid) for rowid, doc in matches]
+        )
+        if matches or not upsert:
+            return UpdateResult(len(matches), len(matches))
+        seed = {k: v for k, v in (filter or {}).items() if not isinstance(v, dict)}
+        upserted_id = self._insert_rows([_apply_update(seed, update)])[0]
+        return UpdateResult(0, 0, upserted_id)
+
+    def _update(self, filter, update, upsert, many):
+        # The read and the writes share one transaction, so a concurrent
+        # writer (another worker process) can't change the matched rows
+        with self.database._transaction():
+            return self._update_rows(filter, update, upsert, many)
+
+    def _bulk_write(self, requests):
+        matched = upserted = 0
+        with self.database._transaction():
+            for request in requests:
+                many = type(request).__name__ == "UpdateMany"
+                if type(request).__name__ not in ("UpdateOne", "UpdateMany"):
+                    raise NotImplementedError(
+                        f"{type(request).__name__} is not supported by the SQLite backend's bulk_write"
+                    )
+                result = self._update_rows(request._filter, request._doc, request._upsert, many)
+                matched += result.matched_count
+                upserted += result.upserted_id is not None
+        return BulkWriteResult(matched, matched, upserted)
+
+    def _find_and_update(self, filter, update, projection, upsert, return_after):
+        with self.database._transaction():
+            before = self._select(filter, None, limit=1)
+            result = self._update_rows(filter, update, upsert, False)
+            if not return_after:
+                return _project(before[0], projection) if before else None
+            if not before and result.upserted_id is None:
+                return None
+            after = self._select({"_id": before[0]["_id"] if before else result.upserted_id}, projection, limit=1)
+            return after[0]
+
+    def _delete(self, filter, many, projection=None):
+        with self.database._transaction() as conn:
+            matches = self._select(filter, None, limit=0 if many else 1, with_rowid=True)
+            conn.executemany(
+                f"DELETE FROM {self._table} WHERE rowid = ?", [(rowid,) for rowid, _ in matches]
+            )
+        return [_project(doc, projection) for _, doc in matches]
+
+    def _open_stream(self, filter, sort, skip, limit):
+        # A separate connection reads from one WAL snapshot, so batches can be
+        # fetched while writes continue on the main connection
+        reader = self.database._connect()
+        try:
+            return reader, reader.execute(*self._select_sql("doc", filter, sort, skip, limit))
+        except Exception:
+            reader.close()
+            raise
+
+    def _count(self, filter):
+        where, params = _where(filter)
+        return self.database._conn.execute(f"SELECT COUNT(*) FROM {self._table}{where}", params).fetchone()[0]
+
+    def _create_index(self, keys, name):
+        columns = ", ".join(
+            f"{_field_expr(field)}{' DESC' if direction < 0 else ''}" for field, direction in keys
+        )
+        self.database._conn.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON {self._table} ({columns})')
+        return name
+
+    def _drop(self):
+        self.database._conn.execute(f"DROP TABLE IF EXISTS {self._table}")
+        self._created = False
+
+    # ---- Motor-compatible API ----
+
+    def find(self, filter: Optional[dict] = None, projection: Optional[dict] = None) -> SQLiteCursor:
+        return SQLiteCursor(self, filter, projection)
+
+    async def find_one(self, filter: Optional[dict] = None, projection: Optional[dict] = None, sort=None):
+        docs = await self._run(self._select, filter, projection, sort, 0, 1)
+        return docs[0] if docs else None
+
+    async def insert_one(self, document: dict) -> InsertOneResult:
+        ids = await self._run(self._insert, [document])
+        return InsertOneResult(ids[0])
+
+    async def insert_many(self, documents, ordered: bool = True) -> InsertManyResult:
+        return InsertManyResult(await self._run(self._insert, list(documents)))
+
+    async def update_one(self, filter: dict, update: dict, upsert: bool = False) -> UpdateResult:
+        return await self._run(self._update, filter, update, upsert, False)
+
+    async def update_many(self, filter: dict, update: dict, upsert: bool = False) -> UpdateResult:
+        return await self._run(self._update, filter, update, upsert, True)
+
+    async def bulk_write(self, requests, ordered: bool = True) -> BulkWriteResult:
+        """Apply pymongo UpdateOne/UpdateMany requests in one transaction."""
+        return await self._run(self._bulk_write, list(requests))
+
+    async def delete_one(self, filter: dict) -> DeleteResult:
+        return DeleteResult(len(await self._run(self._delete, filter, False)))
+
+    async def delete_many(self, filter: dict) -> DeleteResult:
+        return DeleteResult(len(await self._run(self._delete, filter, True)))
+
+    async def find_one_and_delete(self, filter: dict, projection: Optional[dict] = None):
+        deleted = await self._run(self._delete, filter, False, projection)
+        return deleted[0] if deleted else None
+
+    async def find_one_and_update(self, filter: dict, update: dict, projection: Optional[dict] = None,
+                                  upsert: bool = False, return_document: bool = False):
+        """return_document is pymongo's ReturnDocument (AFTER is True)."""
+        return await self._run(self._find_and_update, filter, update, projection, upsert, bool(return_document))
+
+    async def count_documents(self, filter: dict) -> int:
+        return await self._run(self._count, filter)
+
+    async def create_index(self, keys, name: Optional[str] = None, **kwargs) -> str:
+        keys = _normalize_keys(keys)
+        name = name or f"ix_{self.name}_" + "_".join(f"{field}_{direction}" for field, direction in keys).replace(".", "_").replace("-", "m")
+        return await self._run(self._create_index, keys, name)
+
+    async def drop(self):
+        await self._run(self._drop)
+
+    def aggregate(self, pipeline, **kwargs):
+        raise NotImplementedError("Aggregation pipelines are not supported by the SQLite backend")
+
+
+class SQLiteDatabase:
+    # Callers check this to fall back from aggregation pipelines to Python
+    supports_aggregation = False
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn = self._connect()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=OFF")
+        self._collections = {}
+
+    def _connect(self):
+        return sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    @contextmanager
+    def _transaction(self):
+        # The connection is in autocommit mode (isolation_level=None), so
+        # multi-statement writes need an explicit transaction. IMMEDIATE takes
+        # the write lock up front, before the rows to change are read.
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def __getitem__(self, name: str) -> SQLiteCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = SQLiteCollection(self, name)
+        return collection
+
+    def __getattr__(self, name: str) -> SQLiteCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def list_collection_names(self):
+        rows = await self._run(
+            lambda: self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+        )
+        return [name for (name,) in rows]
+
+    async def drop_collection(self, name: str):
+        await self[name].drop()
+
+    async def command(self, command: Any):
+        if command == "ping" or command == {"ping": 1}:
+            return {"ok": 1.0}
+        raise NotImplementedError(f"Command {command!r} is not supported by the SQLite backend")
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._conn.close()
+
+
+class SQLiteClient:
+    """Stand-in for AsyncIOMotorClient backed by one SQLite file.
+
+    Every database name maps to the same file.
+    """
+
+    def __init__(self, path: str):
+        self._database = SQLiteDatabase(path)
+
+    def __getitem__(self, name: str) -> SQLiteDatabase:
+        return self._database
+
+    def __getattr__(self, name: str) -> SQLiteDatabase:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self._database
+
+    def close(self):
+        self._database.close()
@@ -0,0 +1,44 @@
+"""
+Storage Backends
+Chooses where the app keeps its data, based on STORAGE_BACKEND:
+
+- mongo (default): MongoDB via Motor, configured with MONGO_URL
+- sqlite: an embedded SQLite file (SQLITE_PATH, default backend/invoicehub.db)
+  for single-PC branch shops that do not want to run a MongoDB server
+
+Both return a client whose `client[DB_NAME]` supports the same collection
+calls, so server.py and the scripts do not care which one is in use.
+"""
+import os
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+
+BACKENDS = ("mongo", "sqlite")
+
+
+def storage_backend() -> str:
+    backend = os.environ.get("STORAGE_BACKEND", "mongo").lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"STORAGE_BACKEND must be one of {', '.join(BACKENDS)}, got {backend!r}")
+    return backend
+
+
+def create_client(mongo_event_listeners=None, **mongo_options):
+    """Create a client for the configured backend.
+
+    mongo_event_listeners is a callable returning pymongo event listeners; it
+    is only called for the mongo backend.
+    """
+    if storage_backend() == "sqlite":
+        from sqlite_store import SQLiteClient
+        return SQLiteClient(os.environ.get("SQLITE_PATH", str(ROOT_DIR / "invoicehub.db")))
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+    if mongo_event_listeners is not None:
+        mongo_options["event_listeners"] = mongo_event_listeners()
+    return AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"), **mongo_options)
+
+
+def get_database(client):
+    return client[os.environ.get("DB_NAME", "invoicehub")]
@@ -0,0 +1,79 @@
+import pytest
+
+import admission
+from admission import AdmissionController, AdmissionRejected, Priority
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    monkeypatch.setenv("ADMISSION_MAX_CONCURRENCY", "10")
+    monkeypatch.setenv("ADMISSION_RATE_PER_SECOND", "2")
+    monkeypatch.setenv("ADMISSION_BURST", "3")
+    return AdmissionController()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.mark.parametrize("method, path, route, priority", [
+    ("POST", "/api/invoices", "create_invoice", Priority.BILLING),
+    ("POST", "/api/payments", "create_payment", Priority.BILLING),
+    ("GET", "/api/dashboard", "dashboard", Priority.REPORT),
+    ("GET", "/api/reports/top-products", "reports", Priority.REPORT),
+    ("GET", "/api/retailers", "read", Priority.READ),
+    ("PUT", "/api/products/p1", "write", Priority.WRITE),
+])
+def test_classify(controller, method, path, route, priority):
+    assert controller.classify(method, path)[:2] == (route, priority)
+
+
+def test_exempt_requests(controller):
+    assert controller.admit("GET", "/api/health", "ip:1.2.3.4") is None
+    assert controller.admit("OPTIONS", "/api/invoices", "ip:1.2.3.4") is None
+    assert controller.in_flight == 0
+
+
+def test_route_concurrency_limit(controller):
+    tickets = [controller.admit("GET", "/api/reports/sales", f"user:{i}") for i in range(2)]
+
+    with pytest.raises(AdmissionRejected):
+        controller.admit("GET", "/api/reports/sales", "user:other")
+    controller.release(tickets[0])
+    assert controller.admit("GET", "/api/reports/sales", "user:other") is not None
+    assert controller.stats()["shed"] == {"reports": 1}
+
+
+def test_reports_shed_before_billing(controller):
+    # Reports may fill half of the budget of 10, billing all of it
+    for i in range(5):
+        controller.admit("GET", "/api/retailers", f"user:{i}")
+
+    with pytest.raises(AdmissionRejected, match="busy"):
+        controller.admit("GET", "/api/dashboard", "user:reports")
+    assert controller.admit("POST", "/api/invoices", "user:billing").priority == Priority.BILLING
+
+
+def test_rate_limit_per_identity(controller, clock):
+    for _ in range(3):
+        controller.release(controller.admit("GET", "/api/retailers", "user:a"))
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.admit("GET", "/api/retailers", "user:a")
+    assert excinfo.value.retry_after == 1
+    # Other callers have their own bucket
+    controller.release(controller.admit("GET", "/api/retailers", "user:b"))
+
+    clock[0] += 0.5
+    controller.release(controller.admit("GET", "/api/retailers", "user:a"))
+
+
+def test_rate_limit_buckets_are_bounded(controller, monkeypatch):
+    monkeypatch.setattr(admission, "MAX_BUCKETS", 3)
+    for i in range(5):
+        controller.release(controller.admit("GET", "/api/retailers", f"ip:10.0.0.{i}"))
+
+    assert controller.stats()["tracked_callers"] == 3
@@ -0,0 +1,166 @@
+import asyncio
+
+from pymongo.errors import BulkWriteError
+
+from audit import AUDIT_COLLECTION, AuditLog, _only_duplicates
+
+
+class FakeCollection:
+    """Stores events by _id and behaves like an unordered Mongo insert_many."""
+
+    def __init__(self, failures=0, partial=0):
+        self.docs = {}
+        self.calls = 0
+        self.failures = failures
+        self.partial = partial
+        self.gate = None
+
+    async def insert_many(self, documents, ordered=True):
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.failures:
+            self.failures -= 1
+            # The connection drops after part of the batch is written
+            for doc in documents[:self.partial]:
+                self.docs[doc["_id"]] = doc
+            raise ConnectionError("connection reset")
+        duplicates = [{"index": i, "code": 11000} for i, doc in enumerate(documents) if doc["_id"] in self.docs]
+        for doc in documents:
+            self.docs.setdefault(doc["_id"], doc)
+        if duplicates:
+            raise BulkWriteError({"writeErrors": duplicates, "writeConcernErrors": [], "nInserted": 0})
+
+
+class FakeDatabase:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getitem__(self, name):
+        assert name == AUDIT_COLLECTION
+        return self.collection
+
+
+def _audit_log(monkeypatch, **env):
+    settings = {"AUDIT_FLUSH_INTERVAL": "60", "AUDIT_RETRY_BASE_SECONDS": "0", **env}
+    for name, value in settings.items():
+        monkeypatch.setenv(name, value)
+    return AuditLog()
+
+
+async def _record(log, count):
+    for i in range(count):
+        await log.record("admin@stationery.com", "create", "retailer", f"r{i}")
+
+
+def test_only_duplicates():
+    def error(*codes, concern=()):
+        return BulkWriteError({"writeErrors": [{"code": code} for code in codes],
+                               "writeConcernErrors": list(concern)})
+
+    assert _only_duplicates(error(11000, 11000))
+    assert not _only_duplicates(error(11000, 121))
+    assert not _only_duplicates(error(11000, concern=[{"code": 64}]))
+    assert not _only_duplicates(error())
+    assert not _only_duplicates(ConnectionError("connection reset"))
+
+
+async def test_retry_after_partial_insert_stores_each_event_once(monkeypatch):
+    collection = FakeCollection(failures=1, partial=2)
+    log = _audit_log(monkeypatch)
+    log.start(FakeDatabase(collection))
+
+    await _record(log, 5)
+    await log.close()
+
+    assert len(collection.docs) == 5
+    assert collection.calls == 2
+    assert log.stats() == {
+        "recorded": 5, "flushed": 5, "failed": 0, "retries": 1, "queued": 0, "backpressure_waits": 0,
+    }
+
+
+async def test_failed_writes_are_retried_until_they_succeed(monkeypatch):
+    collection = FakeCollection(failures=8)
+    log = _audit_log(monkeypatch, AUDIT_MAX_RETRIES="2", AUDIT_FLUSH_INTERVAL="0")
+    log.start(FakeDatabase(collection))
+
+    await _record(log, 3)
+    while log.flushed < 3:
+        await asyncio.sleep(0)
+    await log.close()
+
+    # Outside shutdown the retry limit does not apply
+    assert (log.retries, log.failed, len(collection.docs)) == (8, 0, 3)
+
+
+async def test_full_queue_slows_writers_down(monkeypatch):
+    collection = FakeCollection()
+    collection.gate = asyncio.Event()
+    log = _audit_log(monkeypatch, AUDIT_MAX_QUEUE="3", AUDIT_BATCH_SIZE="2")
+    log.start(FakeDatabase(collection))
+
+    writer = asyncio.create_task(_record(log, 8))
+    while collection.calls == 0 or log._queue.qsize() < 3:
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.01)
+    # One batch is stuck in the database, the queue is full and the writer waits
+    assert not writer.done()
+    assert log.backpressure_waits >= 1
+
+    collection.gate.set()
+    await writer
+    await log.close()
+
+    assert (log.recorded, log.flushed, log.failed, len(collection.docs)) == (8, 8, 0, 8)
+
+
+async def test_close_drains_queued_events(monkeypatch):
+    collection = FakeCollection()
+    log = _audit_log(monkeypatch, AUDIT_BATCH_SIZE="4")
+    log.start(FakeDatabase(collection))
+
+    await _record(log, 10)
+    await log.close()
+
+    assert len(collection.docs) == 10
+    assert log.stats()["queued"] == 0
+
+
+async def test_close_gives_up_after_max_retries(monkeypatch):
+    collection = FakeCollection(failures=100)
+    log = _audit_log(monkeypatch, AUDIT_MAX_RETRIES="2")
+    log.start(FakeDatabase(collection))
+
+    await _record(log, 4)
+    await log.close()
+
+    assert (collection.calls, log.failed, log.flushed) == (3, 4, 0)
+
+
+async def test_close_is_time_limited_when_the_database_is_down(monkeypatch):
+    collection = FakeCollection(failures=1000)
+    log = _audit_log(monkeypatch, AUDIT_BATCH_SIZE="2", AUDIT_MAX_RETRIES="20",
+                     AUDIT_RETRY_BASE_SECONDS="1", AUDIT_SHUTDOWN_TIMEOUT_SECONDS="0.2")
+    log.start(FakeDatabase(collection))
+    await _record(log, 7)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await log.close()
+
+    assert loop.time() - started < 1
+    assert (log.failed, log.flushed, log.stats()["queued"]) == (7, 0, 0)
+
+
+async def test_close_is_time_limited_when_a_write_hangs(monkeypatch):
+    collection = FakeCollection()
+    collection.gate = asyncio.Event()
+    log = _audit_log(monkeypatch, AUDIT_MAX_QUEUE="2", AUDIT_BATCH_SIZE="1",
+                     AUDIT_SHUTDOWN_TIMEOUT_SECONDS="0.1")
+    log.start(FakeDatabase(collection))
+    await _record(log, 3)
+
+    await log.close()
+
+    assert (log.failed, log.flushed) == (3, 0)
@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as env:
+        env.setenv("STORAGE_BACKEND", "sqlite")
+        env.setenv("SQLITE_PATH", str(tmp_path_factory.mktemp("batch") / "server.db"))
+        env.setenv("REPORT_REFRESH_INTERVAL", "0")
+        env.setenv("ADMISSION_RATE_PER_SECOND", "1000")
+        env.setenv("ADMISSION_BURST", "1000")
+        import server
+        yield server
+
+
+@pytest.fixture(scope="module")
+def client(server):
+    from auth import create_access_token
+
+    token = create_access_token({"sub": "admin@stationery.com"})
+    with TestClient(server.app, headers={"Authorization": f"Bearer {token}"}) as client:
+        yield client
+
+
+def _batch(client, *operations):
+    response = client.post("/api/batch", json={"operations": [
+        {"method": method, "path": path, **({"body": body} if body is not None else {})}
+        for method, path, body in operations
+    ]})
+    assert response.status_code == 200
+    return response.json()["results"]
+
+
+def _route(server, method, path):
+    return next(r for r in server.app.routes if getattr(r, "path", None) == path and method in r.methods)
+
+
+def _retailer(name):
+    return {"shop_name": name, "owner_name": "Owner", "phone_number": "9876543210", "address": "MG Road"}
+
+
+def test_body_and_path_binding(client):
+    retailer, product = _batch(
+        client,
+        ("POST", "/retailers", _retailer("Batch Books")),
+        ("POST", "/products", {"product_name": "Pen", "category": "Pens", "price": 5.0,
+                               "stock_quantity": 100, "unit": "pieces"}),
+    )
+    assert (retailer["status"], product["status"]) == (200, 200)
+    retailer_id = retailer["body"]["id"]
+
+    invoice, updated, refetched = _batch(
+        client,
+        ("POST", "/invoices", {"retailer_id": retailer_id, "paid_amount": 0,
+                               "products": [{"product_id": product["body"]["id"], "quantity": 4}]}),
+        ("PUT", f"/retailers/{retailer_id}", {"owner_name": "New Owner"}),
+        ("GET", "/retailers", None),
+    )
+    assert invoice["status"] == 200 and invoice["body"]["total_amount"] == 20.0
+    assert updated["status"] == 200 and updated["body"]["owner_name"] == "New Owner"
+    assert [r["owner_name"] for r in refetched["body"] if r["id"] == retailer_id] == ["New Owner"]
+
+    fetched, = _batch(client, ("GET", f"/invoices/{invoice['body']['id']}", None))
+    assert fetched["status"] == 200 and fetched["body"]["invoice_number"] == invoice["body"]["invoice_number"]
+
+
+def test_query_binding(client):
+    dry_run, bad_date = _batch(
+        client,
+        ("POST", "/reminders/run?dry_run=true", None),
+        ("GET", "/reports/top-products?start=yesterday", None),
+    )
+    assert dry_run["status"] == 200 and dry_run["body"]["dry_run"] is True
+    assert bad_date == {"status": 400, "body": {"detail": "Dates must be in YYYY-MM-DD format"}}
+
+
+def test_error_statuses(client):
+    missing, wrong_method, no_such_read, bad_query, bad_body, not_found, nested = _batch(
+        client,
+        ("GET", "/no-such-route", None),
+        ("PATCH", "/retailers", None),
+        ("GET", "/retailers/some-id", None),
+        ("GET", "/reports/top-products?limit=many", None),
+        ("POST", "/retailers", {"shop_name": "No Owner"}),
+        ("GET", "/invoices/does-not-exist", None),
+        ("POST", "/batch", {"operations": []}),
+    )
+    assert missing["status"] == 404
+    assert wrong_method["status"] == 405
+    assert no_such_read["status"] == 405
+    assert bad_query["status"] == 422 and bad_query["body"]["detail"][0]["loc"] == ["query", "limit"]
+    assert bad_body["status"] == 422
+    assert {tuple(e["loc"]) for e in bad_body["body"]["detail"]} >= {("body", "owner_name")}
+    assert not_found["status"] == 404
+    assert nested["status"] == 400
+
+
+def test_results_keep_operation_order(client):
+    operations = [("POST", "/retailers", _retailer(f"Order {i}")) for i in range(3)]
+    operations.insert(1, ("GET", "/retailers", None))
+    operations.append(("GET", "/health", None))
+
+    results = _batch(client, *operations)
+
+    assert [r["status"] for r in results] == [200] * 5
+    assert [results[i]["body"]["shop_name"] for i in (0, 2, 3)] == ["Order 0", "Order 1", "Order 2"]
+    # The read between the writes sees the first write but not the later ones
+    names = {r["shop_name"] for r in results[1]["body"]}
+    assert "Order 0" in names and "Order 1" not in names
+    assert results[4]["body"] == {"status": "ok"}
+
+
+def test_reads_run_concurrently(client, server, monkeypatch):
+    in_flight = {"now": 0, "peak": 0}
+    handler = server.get_retailers
+
+    async def slow_read(*args, **kwargs):
+        in_flight["now"] += 1
+        in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        await asyncio.sleep(0.05)
+        in_flight["now"] -= 1
+        return await handler(*args, **kwargs)
+
+    monkeypatch.setattr(_route(server, "GET", "/api/retailers").dependant, "call", slow_read)
+
+    results = _batch(client, *[("GET", "/retailers", None)] * 3)
+
+    assert [r["status"] for r in results] == [200] * 3
+    assert in_flight["peak"] == 3
+
+
+def test_operations_are_admitted(client, server, monkeypatch):
+    monkeypatch.setattr(server.admission, "rate_per_second", 0.001)
+    monkeypatch.setattr(server.admission, "_buckets", type(server.admission._buckets)())
+    monkeypatch.setattr(server.admission, "burst", 3)
+
+    results = _batch(client, *[("GET", "/products", None)] * 3)
+
+    # The batch request itself takes the first token
+    assert [r["status"] for r in results] == [200, 200, 429]
+    assert results[2]["body"]["retry_after"] >= 1
+
+
+def test_unauthenticated_batch_is_rejected(client):
+    response = client.post("/api/batch", json={"operations": []}, headers={"Authorization": ""})
+    assert response.status_code in (401, 403)
+
+
+def test_unexpected_error_fails_only_that_operation(client, server, monkeypatch):
+    async def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(_route(server, "GET", "/api/products").dependant, "call", broken)
+
+    failed, health = _batch(client, ("GET", "/products", None), ("GET", "/health", None))
+
+    assert failed == {"status": 500, "body": {"detail": "Internal Server Error"}}
+    assert health["status"] == 200
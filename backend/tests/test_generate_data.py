@@ -0,0 +1,62 @@
+from datetime import date
+
+import pytest
+
+from generate_data import BulkLoader, Generator
+
+
+class FailingCollection:
+    async def insert_many(self, documents, ordered=True):
+        raise ConnectionError("connection reset")
+
+
+class FailingDatabase:
+    def __getitem__(self, name):
+        return FailingCollection()
+
+
+def _snapshot(generator):
+    invoices = []
+    for day, count in generator.invoices_per_day(200):
+        if count:
+            invoices.extend(generator.invoices_for_day(day, count, compact=False)[0])
+    return generator.products, generator.retailers, invoices
+
+
+async def test_drain_raises_failed_insert():
+    loader = BulkLoader(FailingDatabase(), concurrency=2)
+    await loader.submit("invoices", [{"id": "i1"}])
+
+    with pytest.raises(ConnectionError):
+        await loader.drain()
+    assert loader.inserted == {}
+
+
+async def test_submit_stops_after_failed_insert():
+    loader = BulkLoader(FailingDatabase(), concurrency=2)
+    await loader.submit("invoices", [{"id": "i1"}])
+    with pytest.raises(ConnectionError):
+        await loader.drain()
+
+    with pytest.raises(ConnectionError):
+        await loader.submit("invoices", [{"id": "i2"}])
+
+
+async def test_loads_into_sqlite(db):
+    loader = BulkLoader(db, concurrency=2)
+    for i in range(3):
+        await loader.submit("invoices", [{"id": f"i{i}-{n}"} for n in range(10)])
+    await loader.drain()
+
+    assert loader.inserted == {"invoices": 30}
+    assert await db.invoices.count_documents({}) == 30
+
+
+def test_same_arguments_same_data():
+    first = _snapshot(Generator(7, retailers=5, products=10, months=3, end_date=date(2025, 4, 1)))
+    second = _snapshot(Generator(7, retailers=5, products=10, months=3, end_date=date(2025, 4, 1)))
+    later = _snapshot(Generator(7, retailers=5, products=10, months=3, end_date=date(2025, 4, 2)))
+
+    assert first == second
+    assert first != later
+    assert max(invoice["invoice_date"] for invoice in first[2]) < "2025-04-01"
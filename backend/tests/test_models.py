@@ -0,0 +1,50 @@
+from models import Invoice, decode_line_items, encode_line_items
+
+
+def _line(product_id, name, quantity, price, discount=0.0, tax=0.0):
+    subtotal = round(price * quantity, 2)
+    return {
+        "product_id": product_id,
+        "product_name": name,
+        "quantity": quantity,
+        "price": price,
+        "total": round(subtotal + tax, 2),
+        "discount_percent": discount,
+        "tax_amount": tax,
+    }
+
+
+def test_round_trip_plain_lines():
+    products = [_line("p1", "Pen", 10, 5.0), _line("p2", "Pencil", 20, 3.0)]
+
+    lines = encode_line_items(products)
+    assert "d" not in lines and "x" not in lines and "n" not in lines
+    assert decode_line_items(lines) == products
+
+
+def test_round_trip_with_discounts_taxes_and_repeated_names():
+    products = [
+        _line("p1", "Notebook", 100, 95.0, discount=5.0, tax=1140.0),
+        _line("p2", "Notebook", 10, 100.0, tax=120.0),
+        _line("p3", "Pen", 5, 5.0),
+    ]
+
+    lines = encode_line_items(products)
+    assert lines["names"] == ["Notebook", "Pen"]
+    assert lines["n"] == [0, 0, 1]
+    assert decode_line_items(lines) == products
+
+
+def test_round_trip_empty():
+    assert decode_line_items(encode_line_items([])) == []
+
+
+def test_invoice_model_decodes_compact_lines():
+    products = [_line("p1", "Pen", 10, 5.0, tax=9.0)]
+    invoice = Invoice(
+        id="i1", invoice_number="INV-1001", retailer_id="r1", retailer_name="Shop",
+        lines=encode_line_items(products), total_amount=59.0, paid_amount=0.0, due_amount=59.0,
+        status="unpaid", invoice_date="2025-01-10T10:00:00+00:00", created_at="2025-01-10T10:00:00+00:00",
+    )
+
+    assert [p.model_dump() for p in invoice.products] == products
@@ -0,0 +1,78 @@
+import pytest
+
+from models import InvoiceLineCreate
+from pricing import PriceTable, PricingEngine, UnknownProductError, bump_catalog_version
+
+PRODUCTS = [
+    {
+        "id": "notebook", "product_name": "A4 Notebook", "price": 100.0, "tax_percent": 12.0,
+        "price_tiers": [{"min_quantity": 50, "discount_percent": 3.0}, {"min_quantity": 100, "discount_percent": 5.0}],
+    },
+    {"id": "pen", "product_name": "Blue Pen", "price": 5.0, "tax_percent": 18.0},
+    {"id": "eraser", "product_name": "Eraser", "price": 2.5},
+]
+
+
+def _lines(*pairs):
+    return [InvoiceLineCreate(product_id=product_id, quantity=quantity) for product_id, quantity in pairs]
+
+
+def test_quote_without_tiers():
+    quote = PriceTable(PRODUCTS).quote(_lines(("pen", 10), ("eraser", 4)))
+
+    pen, eraser = quote.products
+    assert (pen.price, pen.discount_percent, pen.tax_amount, pen.total) == (5.0, 0.0, 9.0, 59.0)
+    assert (eraser.price, eraser.tax_amount, eraser.total) == (2.5, 0.0, 10.0)
+    assert (quote.subtotal, quote.tax_total, quote.total_amount) == (60.0, 9.0, 69.0)
+
+
+@pytest.mark.parametrize("quantity, discount, unit_price", [
+    (49, 0.0, 100.0),
+    (50, 3.0, 97.0),
+    (99, 3.0, 97.0),
+    (100, 5.0, 95.0),
+    (500, 5.0, 95.0),
+])
+def test_quote_picks_best_tier_reached(quantity, discount, unit_price):
+    line = PriceTable(PRODUCTS).quote(_lines(("notebook", quantity))).products[0]
+
+    assert line.discount_percent == discount
+    assert line.price == unit_price
+    subtotal = round(unit_price * quantity, 2)
+    assert line.tax_amount == round(subtotal * 0.12, 2)
+    assert line.total == pytest.approx(subtotal + line.tax_amount)
+
+
+def test_line_totals_are_rounded_to_paise():
+    table = PriceTable([
+        {"id": "clip", "product_name": "Clip", "price": 0.35, "tax_percent": 12.0},
+        {"id": "tape", "product_name": "Tape", "price": 1.15, "tax_percent": 5.0},
+    ])
+    quote = table.quote(_lines(("clip", 1), ("tape", 7)))
+
+    assert [p.total for p in quote.products] == [0.39, 8.45]
+    assert sum(p.total for p in quote.products) == pytest.approx(quote.total_amount)
+
+
+def test_quote_keeps_line_order_and_names():
+    quote = PriceTable(PRODUCTS).quote(_lines(("eraser", 1), ("notebook", 1), ("pen", 1)))
+
+    assert [p.product_name for p in quote.products] == ["Eraser", "A4 Notebook", "Blue Pen"]
+
+
+def test_unknown_product():
+    with pytest.raises(UnknownProductError) as excinfo:
+        PriceTable(PRODUCTS).quote(_lines(("pen", 1), ("stapler", 1)))
+    assert excinfo.value.product_id == "stapler"
+
+
+async def test_engine_rebuilds_when_catalog_version_changes(db):
+    await db.products.insert_many(PRODUCTS)
+    await bump_catalog_version(db)
+    engine, other_worker = PricingEngine(), PricingEngine()
+
+    assert (await engine.quote(db, _lines(("pen", 1)))).subtotal == 5.0
+    await db.products.update_one({"id": "pen"}, {"$set": {"price": 6.0}})
+    await other_worker.catalog_changed(db)
+
+    assert (await engine.quote(db, _lines(("pen", 1)))).subtotal == 6.0
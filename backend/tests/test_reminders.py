@@ -0,0 +1,134 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from reminders import (
+    REMINDER_LOG_COLLECTION, LogTransport, PermanentDeliveryError, ReminderDispatcher,
+)
+
+RETAILERS = [
+    {"id": "r1", "shop_name": "City Books", "owner_name": "Rajesh", "phone_number": "9876543210"},
+    {"id": "r2", "shop_name": "Paper Plus", "owner_name": "Meera", "phone_number": "9876543215"},
+    {"id": "r3", "shop_name": "Smart Stationery", "owner_name": "Sneha", "phone_number": "9876543213"},
+]
+
+
+def _invoice(number, retailer_id, days_old, due, status="unpaid"):
+    return {
+        "id": number,
+        "invoice_number": number,
+        "retailer_id": retailer_id,
+        "due_amount": due,
+        "status": status,
+        "invoice_date": (datetime.now(timezone.utc) - timedelta(days=days_old)).isoformat(),
+    }
+
+
+class FlakyTransport(LogTransport):
+    """Fails the first `failures` sends to each retailer."""
+
+    def __init__(self, failures: int = 0, permanent: bool = False):
+        super().__init__()
+        self.failures = failures
+        self.permanent = permanent
+        self.attempts = {}
+
+    async def send(self, message):
+        attempt = self.attempts[message.retailer_id] = self.attempts.get(message.retailer_id, 0) + 1
+        if self.permanent:
+            raise PermanentDeliveryError("no address")
+        if attempt <= self.failures:
+            raise ConnectionError("gateway timeout")
+        await super().send(message)
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    monkeypatch.setenv("REMINDER_OVERDUE_DAYS", "15")
+    monkeypatch.setenv("REMINDER_COOLDOWN_HOURS", "72")
+    monkeypatch.setenv("REMINDER_MAX_ATTEMPTS", "3")
+    monkeypatch.setenv("REMINDER_RETRY_BASE_SECONDS", "0")
+
+
+async def _seed(db):
+    await db.retailers.insert_many(RETAILERS)
+    await db.invoices.insert_many([
+        _invoice("INV-1001", "r1", 40, 500.0),
+        _invoice("INV-1002", "r1", 20, 250.0, status="partial"),
+        _invoice("INV-1003", "r1", 5, 900.0),                 # not overdue yet
+        _invoice("INV-1004", "r2", 30, 120.0),
+        _invoice("INV-1005", "r3", 60, 0.0, status="paid"),  # settled
+    ])
+
+
+async def test_selects_overdue_totals(db):
+    await _seed(db)
+    dispatcher = ReminderDispatcher(LogTransport())
+
+    stats = await dispatcher.run(db, dry_run=True)
+
+    assert (stats["selected"], stats["sent"]) == (2, 0)
+    preview = {p["retailer_id"]: p for p in stats["preview"]}
+    assert preview["r1"]["total_due"] == 750.0
+    assert preview["r1"]["invoice_numbers"] == ["INV-1001", "INV-1002"]
+    assert "2 invoice(s)" in preview["r1"]["text"]
+    assert preview["r2"]["total_due"] == 120.0
+    assert await db[REMINDER_LOG_COLLECTION].count_documents({}) == 0
+
+
+async def test_retries_transient_failures(db):
+    await _seed(db)
+    transport = FlakyTransport(failures=2)
+
+    stats = await ReminderDispatcher(transport).run(db)
+
+    assert (stats["sent"], stats["failed"], stats["retries"]) == (2, 0, 4)
+    assert sorted(m["retailer_id"] for m in transport.sent) == ["r1", "r2"]
+    log = await db[REMINDER_LOG_COLLECTION].find_one({"_id": "r1"})
+    assert (log["reminders_sent"], log["total_due"], log["transport"]) == (1, 750.0, "log")
+
+
+async def test_gives_up_and_releases_claim(db):
+    await _seed(db)
+    transport = FlakyTransport(failures=3)
+
+    stats = await ReminderDispatcher(transport).run(db)
+    assert (stats["sent"], stats["failed"], stats["retries"]) == (0, 2, 4)
+
+    # A failed delivery does not start the cooldown; the next run tries again
+    stats = await ReminderDispatcher(transport).run(db)
+    assert (stats["sent"], stats["skipped_recent"]) == (2, 0)
+
+
+async def test_permanent_failure_is_not_retried(db):
+    await _seed(db)
+
+    stats = await ReminderDispatcher(FlakyTransport(permanent=True)).run(db)
+
+    assert (stats["sent"], stats["failed"], stats["retries"]) == (0, 2, 0)
+
+
+async def test_cooldown_skips_recent_reminders(db):
+    await _seed(db)
+    await ReminderDispatcher(LogTransport()).run(db)
+
+    stats = await ReminderDispatcher(LogTransport()).run(db)
+    assert (stats["selected"], stats["skipped_recent"], stats["sent"]) == (0, 2, 0)
+
+    # Once the cooldown has passed, retailers are reminded again
+    await db[REMINDER_LOG_COLLECTION].update_many({}, {"$set": {
+        "next_allowed_at": (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+    }})
+    stats = await ReminderDispatcher(LogTransport()).run(db)
+    assert stats["sent"] == 2
+    assert (await db[REMINDER_LOG_COLLECTION].find_one({"_id": "r1"}))["reminders_sent"] == 2
+
+
+async def test_concurrent_workers_send_once(db):
+    await _seed(db)
+    first, second = LogTransport(), LogTransport()
+
+    await asyncio.gather(ReminderDispatcher(first).run(db), ReminderDispatcher(second).run(db))
+
+    assert sorted(m["retailer_id"] for m in first.sent + second.sent) == ["r1", "r2"]
@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import reporting
+from models import encode_line_items
+from reporting import CUBE_COLLECTION, SalesCube
+
+PRODUCTS = [
+    {"id": "pen", "product_name": "Pen", "category": "Pens"},
+    {"id": "book", "product_name": "Notebook", "category": "Notebooks"},
+]
+
+
+def _invoice(invoice_id, retailer_id, day, products, compact=False, age=timedelta(minutes=5)):
+    invoice = {
+        "id": invoice_id,
+        "retailer_id": retailer_id,
+        "retailer_name": f"Shop {retailer_id}",
+        "invoice_date": f"{day}T10:00:00+00:00",
+        "created_at": (datetime.now(timezone.utc) - age).isoformat(),
+    }
+    lines = [
+        {"product_id": product_id, "product_name": name, "quantity": quantity, "price": price,
+         "total": quantity * price}
+        for product_id, name, quantity, price in products
+    ]
+    if compact:
+        invoice["lines"] = encode_line_items(lines)
+    else:
+        invoice["products"] = lines
+    return invoice
+
+
+@pytest.fixture
+def cube(monkeypatch):
+    monkeypatch.setenv("REPORT_REFRESH_INTERVAL", "0")
+    return SalesCube()
+
+
+async def test_refresh_builds_cube_in_python(db, cube):
+    await db.products.insert_many(PRODUCTS)
+    await db.invoices.insert_many([
+        _invoice("i1", "r1", "2025-01-10", [("pen", "Pen", 10, 5.0), ("book", "Notebook", 2, 40.0)]),
+        _invoice("i2", "r1", "2025-01-10", [("pen", "Pen", 4, 5.0)], compact=True),
+        _invoice("i3", "r2", "2025-01-11", [("book", "Notebook", 1, 40.0)]),
+    ])
+
+    assert await cube.refresh(db) == 3
+    assert await db[CUBE_COLLECTION].count_documents({}) == 3
+    pen = await db[CUBE_COLLECTION].find_one({"product_id": "pen"}, {"_id": 0})
+    assert (pen["quantity"], pen["revenue"], pen["invoice_count"], pen["category"]) == (14, 70.0, 2, "Pens")
+
+    top = await cube.top_products(db, "2025-01-01", "2025-01-31")
+    assert [(t["product_id"], t["quantity"], t["revenue"]) for t in top] == [("book", 3, 120.0), ("pen", 14, 70.0)]
+
+    by_category = await cube.category_sales(db, "2025-01-10", "2025-01-10", retailer_id="r1")
+    assert [(row["category"], row["revenue"]) for row in by_category] == [("Notebooks", 80.0), ("Pens", 70.0)]
+
+
+async def test_refresh_is_incremental(db, cube, monkeypatch):
+    monkeypatch.setattr(reporting, "SETTLE_DELAY", timedelta(0))
+    await db.products.insert_many(PRODUCTS)
+    await db.invoices.insert_one(_invoice("i1", "r1", "2025-01-10", [("pen", "Pen", 10, 5.0)]))
+    assert await cube.refresh(db) == 1
+
+    # Nothing new: no work, and nothing counted twice
+    assert await cube.refresh(db) == 0
+    # Invoices past the refresh's upper bound wait for the next one
+    await db.invoices.insert_one(_invoice("i2", "r1", "2025-01-10", [("pen", "Pen", 1, 5.0)], age=-timedelta(minutes=1)))
+    assert await cube.refresh(db) == 0
+
+    await db.invoices.update_one({"id": "i2"}, {"$set": {"created_at": datetime.now(timezone.utc).isoformat()}})
+    assert await cube.refresh(db) == 1
+    pen = await db[CUBE_COLLECTION].find_one({"product_id": "pen"})
+    assert (pen["quantity"], pen["invoice_count"]) == (11, 2)
+
+
+async def test_second_worker_does_not_recount(db, cube):
+    await db.products.insert_many(PRODUCTS)
+    await db.invoices.insert_one(_invoice("i1", "r1", "2025-01-10", [("pen", "Pen", 10, 5.0)]))
+
+    assert await cube.refresh(db) == 1
+    assert await SalesCube().refresh(db) == 0
+    assert (await db[CUBE_COLLECTION].find_one({"product_id": "pen"}))["quantity"] == 10
+
+
+async def test_rebuild(db, cube):
+    await db.products.insert_many(PRODUCTS)
+    await db.invoices.insert_one(_invoice("i1", "r1", "2025-01-10", [("pen", "Pen", 10, 5.0)]))
+    await cube.refresh(db)
+
+    assert await cube.rebuild(db) == 1
+    assert (await db[CUBE_COLLECTION].find_one({"product_id": "pen"}))["quantity"] == 10
+
+
+async def test_failed_fold_marks_cube_stale_and_repair_rebuilds(db, cube, monkeypatch):
+    await db.products.insert_many(PRODUCTS)
+    await db.invoices.insert_one(_invoice("i1", "r1", "2025-01-10", [("pen", "Pen", 10, 5.0)]))
+
+    async def broken(*args):
+        raise ConnectionError("connection reset")
+
+    monkeypatch.setattr(cube, "_refresh_in_python", broken)
+    with pytest.raises(ConnectionError):
+        await cube.refresh(db)
+    monkeypatch.undo()
+
+    # The watermark moved on, so a plain refresh would never fold i1 in
+    assert await cube.refresh(db) == 0
+    status = await cube.status(db)
+    assert (status["stale"], status["failed_folds"]) == (True, 1)
+
+    assert await cube.repair(db) == 1
+    assert (await db[CUBE_COLLECTION].find_one({"product_id": "pen"}))["quantity"] == 10
+    assert (await cube.status(db))["stale"] is False
+    assert await cube.repair(db) is None
+
+
+async def test_unfinished_fold_is_repaired_after_timeout(db, cube):
+    await db.products.insert_many(PRODUCTS)
+    await db.invoices.insert_one(_invoice("i1", "r1", "2025-01-10", [("pen", "Pen", 10, 5.0)]))
+    await cube.refresh(db)
+    # A worker that died mid-fold leaves its pending record behind
+    await db.report_state.insert_one({
+        "_id": "sales_cube|fold|dead", "kind": "fold", "from": "", "to": "x",
+        "started_at": (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat(),
+    })
+
+    assert (await cube.status(db))["stuck_folds"] == 1
+    assert await cube.repair(db) == 1
+    assert await SalesCube().repair(db) is None
+    assert (await db[CUBE_COLLECTION].find_one({"product_id": "pen"}))["quantity"] == 10
+
+
+async def test_successful_folds_leave_no_pending_records(db, cube):
+    await db.products.insert_many(PRODUCTS)
+    await db.invoices.insert_one(_invoice("i1", "r1", "2025-01-10", [("pen", "Pen", 10, 5.0)]))
+
+    await cube.refresh(db)
+    await SalesCube().refresh(db)
+
+    assert await db.report_state.count_documents({"kind": "fold"}) == 0
+    assert (await cube.status(db))["stale"] is False
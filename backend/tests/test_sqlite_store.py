@@ -0,0 +1,152 @@
+import pytest
+from pymongo import ReturnDocument, UpdateOne
+
+import sqlite_store
+
+PRODUCTS = [
+    {"id": "p1", "product_name": "Pen", "category": "Pens", "price": 5.0, "stock_quantity": 100},
+    {"id": "p2", "product_name": "Pencil", "category": "Pencils", "price": 3.0, "stock_quantity": 0},
+    {"id": "p3", "product_name": "Notebook", "category": "Notebooks", "price": 40.0, "stock_quantity": 12},
+    {"id": "p4", "product_name": "Eraser", "category": "Accessories", "price": 5.0, "stock_quantity": 7,
+     "discontinued": True},
+]
+
+
+async def _ids(cursor):
+    return [doc["id"] for doc in await cursor.to_list(None)]
+
+
+async def test_filters(db):
+    await db.products.insert_many(PRODUCTS)
+
+    assert await _ids(db.products.find({"category": "Pens"})) == ["p1"]
+    assert await _ids(db.products.find({"price": {"$gte": 5.0, "$lt": 40.0}}).sort("id")) == ["p1", "p4"]
+    assert await _ids(db.products.find({"id": {"$in": ["p2", "p3", "missing"]}}).sort("id")) == ["p2", "p3"]
+    assert await _ids(db.products.find({"id": {"$nin": ["p1", "p2"]}}).sort("id")) == ["p3", "p4"]
+    assert await _ids(db.products.find({"id": {"$in": []}})) == []
+    assert await _ids(db.products.find({"discontinued": {"$exists": True}})) == ["p4"]
+    assert await _ids(db.products.find({"discontinued": None}).sort("id")) == ["p1", "p2", "p3"]
+    assert await db.products.count_documents({"stock_quantity": {"$gt": 0}}) == 3
+
+
+async def test_nested_fields_and_projection(db):
+    await db.invoices.insert_one({"id": "i1", "lines": {"pid": ["p1"], "q": [5]}, "status": "paid"})
+
+    invoice = await db.invoices.find_one({"lines.pid": ["p1"]}, {"_id": 0, "id": 1, "status": 1})
+    assert invoice == {"id": "i1", "status": "paid"}
+    assert "lines" not in await db.invoices.find_one({"id": "i1"}, {"_id": 0, "lines": 0})
+
+
+async def test_sort_skip_limit(db):
+    await db.products.insert_many(PRODUCTS)
+
+    assert await _ids(db.products.find({}).sort([("price", -1), ("id", 1)])) == ["p3", "p1", "p4", "p2"]
+    assert await _ids(db.products.find({}).sort("price", 1).skip(1).limit(2)) in (["p1", "p4"], ["p4", "p1"])
+    assert len(await db.products.find({}).to_list(3)) == 3
+    cheapest = await db.products.find_one({}, {"_id": 0}, sort=[("price", 1)])
+    assert cheapest["id"] == "p2"
+
+
+async def test_update_operators(db):
+    await db.products.insert_many(PRODUCTS)
+
+    result = await db.products.update_one(
+        {"id": "p1"}, {"$set": {"price": 6.0}, "$inc": {"stock_quantity": -10}, "$unset": {"category": ""}}
+    )
+    assert (result.matched_count, result.modified_count) == (1, 1)
+    pen = await db.products.find_one({"id": "p1"}, {"_id": 0})
+    assert pen["price"] == 6.0 and pen["stock_quantity"] == 90 and "category" not in pen
+
+    result = await db.products.update_many({"price": 5.0}, {"$set": {"on_sale": True}})
+    assert result.matched_count == 1
+    result = await db.products.update_many({"price": {"$lt": 10}}, {"$inc": {"stock_quantity": 1}})
+    assert result.matched_count == 3
+
+    missing = await db.products.update_one({"id": "nope"}, {"$set": {"price": 1.0}})
+    assert missing.matched_count == 0 and missing.upserted_id is None
+
+
+async def test_upsert_seeds_document_from_filter(db):
+    result = await db.report_state.update_one({"_id": "cube"}, {"$inc": {"refreshes": 1}}, upsert=True)
+    assert result.upserted_id == "cube"
+    await db.report_state.update_one({"_id": "cube"}, {"$inc": {"refreshes": 1}}, upsert=True)
+    assert await db.report_state.find_one({"_id": "cube"}) == {"_id": "cube", "refreshes": 2}
+
+
+async def test_find_one_and_update(db):
+    await db.counters.insert_one({"_id": "invoice_number", "seq": 1000})
+
+    before = await db.counters.find_one_and_update({"_id": "invoice_number"}, {"$inc": {"seq": 1}})
+    assert before["seq"] == 1000
+    after = await db.counters.find_one_and_update(
+        {"_id": "invoice_number"}, {"$inc": {"seq": 1}}, return_document=ReturnDocument.AFTER
+    )
+    assert after["seq"] == 1002
+
+    assert await db.counters.find_one_and_update({"_id": "other"}, {"$inc": {"seq": 1}}) is None
+    created = await db.counters.find_one_and_update(
+        {"_id": "other"}, {"$inc": {"seq": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    assert created == {"_id": "other", "seq": 1}
+
+
+async def test_delete(db):
+    await db.products.insert_many(PRODUCTS)
+
+    assert (await db.products.delete_one({"price": 5.0})).deleted_count == 1
+    deleted = await db.products.find_one_and_delete({"id": "p3"}, {"_id": 0, "product_name": 1})
+    assert deleted == {"product_name": "Notebook"}
+    assert (await db.products.delete_many({})).deleted_count == 2
+    assert await db.products.count_documents({}) == 0
+
+
+async def test_bulk_write(db):
+    await db.products.insert_many(PRODUCTS)
+
+    result = await db.products.bulk_write([
+        UpdateOne({"id": "p1"}, {"$inc": {"stock_quantity": 5}}),
+        UpdateOne({"id": "p9"}, {"$set": {"product_name": "Ruler"}}, upsert=True),
+    ], ordered=False)
+    assert (result.matched_count, result.upserted_count) == (1, 1)
+    assert (await db.products.find_one({"id": "p1"}))["stock_quantity"] == 105
+    assert (await db.products.find_one({"id": "p9"}))["product_name"] == "Ruler"
+
+
+async def test_insert_many_is_atomic(db):
+    await db.audit_log.insert_one({"_id": "e1"})
+
+    with pytest.raises(Exception):
+        await db.audit_log.insert_many([{"_id": "e2"}, {"_id": "e1"}])
+    assert await db.audit_log.count_documents({}) == 1
+
+
+async def test_cursor_iteration(db):
+    await db.products.insert_many(PRODUCTS)
+
+    names = [p["product_name"] async for p in db.products.find({"stock_quantity": {"$gt": 0}}).sort("id")]
+    assert names == ["Pen", "Notebook", "Eraser"]
+
+
+async def test_cursor_streams_in_batches(db, monkeypatch):
+    monkeypatch.setattr(sqlite_store, "STREAM_BATCH_SIZE", 3)
+    await db.invoices.insert_many([{"id": f"i{n:02d}", "n": n} for n in range(10)])
+
+    seen = []
+    async for invoice in db.invoices.find({"n": {"$gte": 2}}, {"_id": 0, "n": 1}).sort("n", -1).skip(1).limit(5):
+        seen.append(invoice)
+        # Writes go on while the cursor is open; it reads one snapshot
+        await db.invoices.update_one({"n": invoice["n"]}, {"$set": {"seen": True}})
+        await db.invoices.insert_one({"id": f"new{invoice['n']}", "n": 100 + invoice["n"]})
+
+    assert seen == [{"n": n} for n in (8, 7, 6, 5, 4)]
+    assert await db.invoices.count_documents({"seen": True}) == 5
+
+
+async def test_abandoned_cursor_does_not_block_writes(db):
+    await db.products.insert_many(PRODUCTS)
+
+    async for product in db.products.find({}):
+        break
+    await db.products.insert_one({"id": "p5"})
+
+    assert await db.products.count_documents({}) == 5
@@ -36,4 +36,12 @@ api.interceptors.response.use(
   }
 );
 
+// Run several API calls in one round trip via /api/batch.
+// Each operation is { method, path, body }; results come back in order as
+// { status, body }.
+export const batch = async (operations) => {
+  const response = await api.post('/batch', { operations });
+  return response.data.results;
+};
+
 export default api;
\ No newline at end of file
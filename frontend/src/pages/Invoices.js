@@ -2,7 +2,11 @@ import React, { useState, useEffect } from 'react';
 import { Table, Button, Modal, Form, Select, InputNumber, Input, message, Tag, Card } from 'antd';
 import { Plus, Eye, Trash2 } from 'lucide-react';
 import Layout from '../components/Layout';
-import api from '../api/axios';
+import api, { batch } from '../api/axios';
+
+// Wait for typing to pause before pricing; every quote counts against the
+// user's rate limit, which all counters logged in as one admin share
+const QUOTE_DEBOUNCE_MS = 300;
 
 const Invoices = () => {
   const [invoices, setInvoices] = useState([]);
@@ -14,46 +18,86 @@ const Invoices = () => {
   const [selectedInvoice, setSelectedInvoice] = useState(null);
   const [form] = Form.useForm();
   const [selectedProducts, setSelectedProducts] = useState([]);
+  const [quote, setQuote] = useState(null);
 
   useEffect(() => {
-    fetchInvoices();
-    fetchRetailers();
-    fetchProducts();
+    fetchPageData();
   }, []);
 
-  const fetchInvoices = async () => {
+  // Totals come from the server so discounts and taxes match the invoice
+  useEffect(() => {
+    const lines = selectedProducts
+      .filter(item => item.product_id && item.quantity > 0)
+      .map(item => ({ product_id: item.product_id, quantity: item.quantity }));
+    if (lines.length === 0) {
+      setQuote(null);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(() => {
+      api.post('/invoices/quote', { products: lines })
+        .then(response => {
+          if (!cancelled) setQuote(response.data);
+        })
+        .catch(error => {
+          if (!cancelled) {
+            setQuote(null);
+            message.error(error.response?.data?.detail || 'Failed to price invoice');
+          }
+        });
+    }, QUOTE_DEBOUNCE_MS);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [selectedProducts]);
+
+  const fetchPageData = async () => {
     setLoading(true);
     try {
-      const response = await api.get('/invoices');
-      setInvoices(response.data);
+      const [invoicesResult, retailersResult, productsResult] = await batch([
+        { method: 'GET', path: '/invoices' },
+        { method: 'GET', path: '/retailers' },
+        { method: 'GET', path: '/products' },
+      ]);
+      if (invoicesResult.status === 200) {
+        setInvoices(invoicesResult.body);
+      } else {
+        message.error('Failed to fetch invoices');
+      }
+      if (retailersResult.status === 200) {
+        setRetailers(retailersResult.body);
+      } else {
+        message.error('Failed to fetch retailers');
+      }
+      if (productsResult.status === 200) {
+        setProducts(productsResult.body);
+      } else {
+        message.error('Failed to fetch products');
+      }
     } catch (error) {
-      message.error('Failed to fetch invoices');
+      message.error('Failed to load invoice data');
     } finally {
       setLoading(false);
     }
   };
 
-  const fetchRetailers = async () => {
-    try {
-      const response = await api.get('/retailers');
-      setRetailers(response.data);
-    } catch (error) {
-      message.error('Failed to fetch retailers');
-    }
-  };
-
-  const fetchProducts = async () => {
+  const fetchInvoices = async () => {
+    setLoading(true);
     try {
-      const response = await api.get('/products');
-      setProducts(response.data);
+      const response = await api.get('/invoices');
+      setInvoices(response.data);
     } catch (error) {
-      message.error('Failed to fetch products');
+      message.error('Failed to fetch invoices');
+    } finally {
+      setLoading(false);
     }
   };
 
   const handleAdd = () => {
     form.resetFields();
     setSelectedProducts([]);
+    setQuote(null);
     setModalVisible(true);
   };
 
@@ -76,15 +120,7 @@ const Invoices = () => {
     setSelectedProducts(updated);
   };
 
-  const calculateTotal = () => {
-    return selectedProducts.reduce((total, item) => {
-      const product = products.find(p => p.id === item.product_id);
-      if (product && item.quantity) {
-        return total + (product.price * item.quantity);
-      }
-      return total;
-    }, 0);
-  };
+  const totalAmount = quote ? quote.total_amount : 0;
 
   const handleSubmit = async (values) => {
     if (selectedProducts.length === 0) {
@@ -92,16 +128,11 @@ const Invoices = () => {
       return;
     }
 
-    const invoiceProducts = selectedProducts.map(item => {
-      const product = products.find(p => p.id === item.product_id);
-      return {
-        product_id: product.id,
-        product_name: product.product_name,
-        quantity: item.quantity,
-        price: product.price,
-        total: product.price * item.quantity
-      };
-    });
+    // Prices, discounts and taxes are applied by the server from the catalog
+    const invoiceProducts = selectedProducts.map(item => ({
+      product_id: item.product_id,
+      quantity: item.quantity
+    }));
 
     const invoiceData = {
       retailer_id: values.retailer_id,
@@ -125,7 +156,7 @@ const Invoices = () => {
       title: 'Invoice #',
       dataIndex: 'invoice_number',
       key: 'invoice_number',
-      sorter: (a, b) => a.invoice_number.localeCompare(b.invoice_number),
+      sorter: (a, b) => a.invoice_number.localeCompare(b.invoice_number, undefined, { numeric: true }),
     },
     {
       title: 'Retailer',
@@ -304,10 +335,22 @@ const Invoices = () => {
           </div>
 
           <div className="bg-secondary p-4 rounded mb-4" style={{ background: '#F3F4F6' }}>
+            {quote && (
+              <>
+                <div className="flex justify-between mb-1">
+                  <span>Subtotal:</span>
+                  <span>₹{quote.subtotal.toFixed(2)}</span>
+                </div>
+                <div className="flex justify-between mb-2">
+                  <span>Tax:</span>
+                  <span>₹{quote.tax_total.toFixed(2)}</span>
+                </div>
+              </>
+            )}
             <div className="flex justify-between items-center">
               <span className="font-medium">Total Amount:</span>
-              <span className="font-heading text-2xl font-bold" style={{ color: '#312E81' }}>
-                ₹{calculateTotal().toFixed(2)}
+              <span className="font-heading text-2xl font-bold" style={{ color: '#312E81' }} data-testid="invoice-total">
+                ₹{totalAmount.toFixed(2)}
               </span>
             </div>
           </div>
@@ -319,7 +362,7 @@ const Invoices = () => {
           >
             <InputNumber
               min={0}
-              max={calculateTotal()}
+              max={totalAmount}
               step={0.01}
               style={{ width: '100%' }}
               data-testid="paid-amount-input"